@@ -0,0 +1,60 @@
+"""Per-message cost of the crisis check as the phrase list grows.
+
+Run from the backend directory:
+
+    python benchmarks/bench_crisis.py
+
+Compares CrisisDetector against the original substring loop for phrase lists of increasing
+size. The detector's time per message should stay roughly flat; the loop's grows linearly.
+"""
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crisis import CrisisDetector, DEFAULT_PHRASES_PATH, load_phrases  # noqa: E402
+
+MESSAGES = [
+    "hi",
+    "I had a really long day at work and I just feel tired of everything lately.",
+    "can't sleep again, my mind keeps racing about the exam tomorrow and what my parents will say",
+    "honestly some days I want to die",
+    "Ich bin so müde und weiß nicht, mit wem ich reden soll.",
+] * 20
+PHRASE_COUNTS = [10, 100, 1000, 10000]
+
+
+def synthetic_phrases(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    phrases = load_phrases(DEFAULT_PHRASES_PATH)
+    while len(phrases) < count:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 8))) for _ in range(rng.randint(2, 4))]
+        phrases.append(" ".join(words))
+    return phrases[:count]
+
+
+def per_message_us(check, repeat: int = 5) -> float:
+    number = 20
+    best = min(timeit.repeat(lambda: [check(m) for m in MESSAGES], number=number, repeat=repeat))
+    return best / (number * len(MESSAGES)) * 1e6
+
+
+def main():
+    print(f"{'phrases':>8} {'automaton (us/msg)':>20} {'substring loop (us/msg)':>25}")
+    for count in PHRASE_COUNTS:
+        phrases = synthetic_phrases(count)
+        detector = CrisisDetector(phrases)
+        lowered = [p.lower() for p in phrases]
+
+        def substring_loop(message):
+            text = message.lower()
+            return any(phrase in text for phrase in lowered)
+
+        print(f"{count:>8} {per_message_us(detector.matches):>20.2f} {per_message_us(substring_loop):>25.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Microbenchmarks for the code that runs on every request, with a regression check.
+
+Run from the backend directory:
+
+    python benchmarks/bench_hot_paths.py                  # compare with the baseline
+    python benchmarks/bench_hot_paths.py --save-baseline  # record a new baseline
+
+Drives main.py in-process with the mock model (no latency, no network) and measures, for
+chat histories of 1 to 1,000 turns where it matters:
+- validate: parsing and validating a ChatRequest body with Pydantic
+- history_dicts: converting the validated history back into dicts for the model
+- crisis_check: the crisis phrase scan, per message (short, long, and one that matches)
+- quest_select: picking today's quest
+- chat_request / quest_request: a full request through the middleware stack (CORS, request
+  id, metrics), the rate limiter (memory store) and the handler, over an in-process ASGI
+  transport
+
+For each it records the best mean time per call and the peak memory allocated by one call
+(tracemalloc). Results are compared with benchmarks/baseline_hot_paths.json; any operation
+slower or more memory-hungry than the baseline by more than --threshold is reported and the
+script exits with status 1. Baselines are machine-specific: record one on the machine (or
+CI runner type) that runs the comparison.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+from datetime import date
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.update(
+    MODEL_BACKEND="mock",
+    MOCK_LATENCY_MS="0",
+    MOCK_CHUNK_INTERVAL_MS="0",
+    # The limiter stays on (memory store) with buckets too large to ever reject.
+    RATE_LIMIT_STORE="memory",
+    CHAT_RATE_LIMIT_BURST="1e12",
+    CHAT_RATE_LIMIT_PER_MINUTE="1e12",
+    LOG_LEVEL="WARNING",
+    # Keep the rolling summary (background model calls) out of the measurements.
+    HISTORY_TOKEN_BUDGET="0",
+)
+
+import httpx  # noqa: E402
+
+import main  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline_hot_paths.json")
+HISTORY_SIZES = [1, 10, 100, 1000]
+MESSAGES = [
+    "hi",
+    "I had a really long day at work and I just feel tired of everything lately.",
+    "can't sleep again, my mind keeps racing about the exam tomorrow and what my parents will say",
+    "honestly some days I want to die",
+]
+
+
+def chat_body(turns: int) -> bytes:
+    history = [
+        {"role": "user" if i % 2 == 0 else "model", "parts": [f"turn {i}: I've been thinking about how the week went and what I want to change."]}
+        for i in range(turns)
+    ]
+    return json.dumps({"message": "I feel a bit better today", "chat_history": history}).encode()
+
+
+def measure(run, min_seconds: float, repeat: int = 5) -> dict:
+    """Calls ``run(n)`` (which performs the operation n times) and returns per-call stats."""
+    number = 1
+    while True:
+        started = time.perf_counter()
+        run(number)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds / repeat or number >= 1_000_000:
+            break
+        number *= 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        started = time.perf_counter()
+        run(number)
+        best = min(best, time.perf_counter() - started)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline_memory, _ = tracemalloc.get_traced_memory()
+    run(1)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"us_per_call": best / number * 1e6, "peak_kib": max(0, peak - baseline_memory) / 1024}
+
+
+def sync_operations():
+    for turns in HISTORY_SIZES:
+        body = chat_body(turns)
+        chat_request = main.ChatRequest.model_validate_json(body)
+        yield f"validate[{turns}]", lambda n, body=body: [main.ChatRequest.model_validate_json(body) for _ in range(n)]
+        yield f"history_dicts[{turns}]", lambda n, r=chat_request: [main.strip_legacy_prefix([h.model_dump() for h in r.chat_history]) for _ in range(n)]
+    for i, message in enumerate(MESSAGES):
+        yield f"crisis_check[{i}]", lambda n, m=message: [main.is_crisis_message(m) for _ in range(n)]
+    today = date.today()
+    yield "quest_select", lambda n: [main.quest_catalogue.current.for_day(today, None) for _ in range(n)]
+    yield "quest_select_user", lambda n: [main.quest_catalogue.current.for_day(today, "user-123") for _ in range(n)]
+
+
+async def request_operations(client: httpx.AsyncClient):
+    for turns in HISTORY_SIZES:
+        body = chat_body(turns)
+
+        async def chat(n, body=body):
+            for _ in range(n):
+                response = await client.post("/api/chat", content=body, headers={"Content-Type": "application/json"})
+                response.raise_for_status()
+        yield f"chat_request[{turns}]", chat
+
+    async def quest(n):
+        for _ in range(n):
+            (await client.get("/api/quest/today")).raise_for_status()
+    yield "quest_request", quest
+
+
+async def run_all(min_seconds: float) -> dict:
+    results = {}
+    for name, operation in sync_operations():
+        results[name] = measure(operation, min_seconds)
+        print_result(name, results[name])
+
+    loop = asyncio.get_running_loop()
+    async with main.app.router.lifespan_context(main.app):
+        await main.model_router.configured()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async for name, operation in request_operations(client):
+                # measure() is synchronous; run each batch to completion on this loop from a thread.
+                def run(n, operation=operation):
+                    asyncio.run_coroutine_threadsafe(operation(n), loop).result()
+                results[name] = await asyncio.to_thread(measure, run, min_seconds)
+                print_result(name, results[name])
+    return results
+
+
+def print_result(name: str, result: dict, note: str = ""):
+    print(f"{name:<22} {result['us_per_call']:>12.1f} {result['peak_kib']:>12.1f}  {note}")
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("us_per_call", "peak_kib"):
+            # Ignore noise on tiny values (sub-microsecond calls, allocations under 1 KiB).
+            floor = 1.0
+            if result[metric] > max(previous[metric], floor) * (1 + threshold):
+                regressions.append(f"{name} {metric}: {previous[metric]:.1f} -> {result[metric]:.1f} "
+                                   f"(+{(result[metric] / max(previous[metric], floor) - 1) * 100:.0f}%)")
+    return regressions
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file.")
+    parser.add_argument("--save-baseline", action="store_true", help="Write the results to the baseline file instead of comparing.")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed slowdown or memory growth before failing (0.25 = 25%%).")
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="Minimum measuring time per operation.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    print(f"{'operation':<22} {'us/call':>12} {'peak KiB':>12}")
+    results = asyncio.run(run_all(args.min_seconds))
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(results, results_file, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"\nBaseline written to {args.baseline}.")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --save-baseline first.")
+        return
+
+    with open(args.baseline) as baseline_file:
+        regressions = compare(results, json.load(baseline_file), args.threshold)
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"\nNo regressions beyond {args.threshold:.0%}.")
+
+
+if __name__ == "__main__":
+    main_cli()
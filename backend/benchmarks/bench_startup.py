@@ -0,0 +1,94 @@
+"""Cold-start timings for the backend.
+
+Run from the backend directory:
+
+    python benchmarks/bench_startup.py --runs 5
+
+For each run this measures, in a fresh process:
+- import: time to ``import main``
+- listening: time from launching uvicorn until ``/healthz`` answers
+- ready: time until ``/readyz`` reports the model as ready
+- first_quest / first_chat: latency of the first /api/quest/today and /api/chat requests
+
+MODEL_BACKEND defaults to ``mock`` (with MOCK_LATENCY_MS=0) so the numbers reflect our own
+startup cost; set MODEL_BACKEND=gemini and GEMINI_API_KEY to include the real SDK setup.
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import main; print(time.perf_counter() - started)"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float, expected_status: int = 200) -> float:
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(url, timeout=1).status_code == expected_status:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError(f"{url} did not return {expected_status} in time.")
+
+
+def timed(method: str, url: str, **kwargs) -> float:
+    started = time.perf_counter()
+    httpx.request(method, url, timeout=60, **kwargs).raise_for_status()
+    return time.perf_counter() - started
+
+
+def run_once(env: dict) -> dict:
+    import_seconds = float(subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    ).stdout.strip().splitlines()[-1])
+
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    launched = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = launched + 60
+        listening = wait_for(f"{base}/healthz", deadline) - launched
+        ready = wait_for(f"{base}/readyz", deadline) - launched
+        first_quest = timed("GET", f"{base}/api/quest/today")
+        first_chat = timed("POST", f"{base}/api/chat", json={"message": "hello", "chat_history": []})
+    finally:
+        server.terminate()
+        server.wait()
+    return {"import": import_seconds, "listening": listening, "ready": ready, "first_quest": first_quest, "first_chat": first_chat}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    env = dict(os.environ, RATE_LIMIT_SCOPES="")
+    env.setdefault("MODEL_BACKEND", "mock")
+    env.setdefault("MOCK_LATENCY_MS", "0")
+
+    runs = [run_once(env) for _ in range(args.runs)]
+    print(f"{'stage':<12} {'median ms':>10} {'max ms':>10}")
+    for stage in runs[0]:
+        values = [run[stage] * 1000 for run in runs]
+        print(f"{stage:<12} {statistics.median(values):>10.1f} {max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional
+
+# Lower values are admitted first.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+
+class UpstreamBusy(Exception):
+    """Raised when a request is not admitted to an upstream slot; ``retry_after`` is in seconds."""
+
+    def __init__(self, reason: str, retry_after: float = 1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class UpstreamLimiter:
+    """Admission control for model calls: a concurrency cap with a bounded priority queue.
+
+    At most ``max_concurrent`` calls hold a slot. Other requests wait in priority order (FIFO
+    within a priority) for at most ``max_wait_seconds``. A request is shed up front, rather than
+    after waiting, when ``max_waiting`` requests are already queued or when the expected wait,
+    estimated from recent slot hold times, is longer than ``max_wait_seconds``. A full queue
+    doesn't shed a request that outranks someone in it: the newest waiter of the lowest priority
+    is shed instead, so background work can't crowd out chat turns. Crisis replies and cheap
+    endpoints never come through here.
+    """
+
+    def __init__(self, max_concurrent: int, max_waiting: int, max_wait_seconds: float = 10):
+        self.max_concurrent = max_concurrent
+        self.max_waiting = max_waiting
+        self.max_wait_seconds = max_wait_seconds
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected: Dict[str, int] = {"queue_full": 0, "overloaded": 0, "timeout": 0}
+        # Exponentially weighted mean of how long a slot is held, in seconds.
+        self.hold_seconds: Optional[float] = None
+        # [priority, sequence, future, enqueued_at]; cancelled waiters stay until popped.
+        self._queue: List[list] = []
+        self._sequence = itertools.count()
+
+    def waiting_by_priority(self) -> Dict[int, int]:
+        counts: Dict[int, int] = {}
+        for priority, _, future, _ in self._queue:
+            if not future.done():
+                counts[priority] = counts.get(priority, 0) + 1
+        return counts
+
+    def oldest_wait_seconds(self) -> float:
+        now = time.monotonic()
+        return max((now - enqueued_at for _, _, future, enqueued_at in self._queue if not future.done()), default=0.0)
+
+    def estimated_wait(self, priority: int) -> float:
+        """Expected time until a new request of this priority gets a slot."""
+        if self.in_flight < self.max_concurrent or self.hold_seconds is None:
+            return 0.0
+        ahead = sum(1 for entry in self._queue if entry[0] <= priority and not entry[2].done())
+        return (ahead + 1) * self.hold_seconds / self.max_concurrent
+
+    def _reject(self, reason: str, retry_after: float):
+        self.rejected[reason] += 1
+        raise UpstreamBusy(reason, retry_after=retry_after)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        if self.in_flight < self.max_concurrent and self.waiting == 0:
+            self.in_flight += 1
+        else:
+            await self._wait_for_slot(priority)
+
+        admitted_at = time.monotonic()
+        try:
+            yield
+        finally:
+            held = time.monotonic() - admitted_at
+            self.hold_seconds = held if self.hold_seconds is None else 0.8 * self.hold_seconds + 0.2 * held
+            self._release()
+
+    def _shed_lower_priority(self, priority: int) -> bool:
+        """Sheds the newest waiter of the lowest priority if it ranks below ``priority``."""
+        victim = max((entry for entry in self._queue if not entry[2].done()), key=lambda entry: entry[:2], default=None)
+        if victim is None or victim[0] <= priority:
+            return False
+        self.waiting -= 1
+        self.rejected["queue_full"] += 1
+        victim[2].set_exception(UpstreamBusy("queue_full", retry_after=self.estimated_wait(victim[0])))
+        return True
+
+    async def _wait_for_slot(self, priority: int):
+        estimated_wait = self.estimated_wait(priority)
+        if self.waiting >= self.max_waiting and not self._shed_lower_priority(priority):
+            self._reject("queue_full", estimated_wait)
+        if estimated_wait > self.max_wait_seconds:
+            self._reject("overloaded", estimated_wait)
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._sequence), future, time.monotonic()])
+        self.waiting += 1
+        try:
+            done, _ = await asyncio.wait({future}, timeout=self.max_wait_seconds)
+        except BaseException:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # The slot was handed over just as we were cancelled; pass it on.
+                self._release()
+            else:
+                future.cancel()
+                self.waiting -= 1
+            raise
+        if not done:
+            future.cancel()
+            self.waiting -= 1
+            self._reject("timeout", self.estimated_wait(priority))
+        # Raises UpstreamBusy if a higher-priority request took our place in the queue.
+        future.result()
+
+    def _release(self):
+        # Hand the slot straight to the best live waiter, so in_flight stays the same.
+        while self._queue:
+            _, _, future, _ = heapq.heappop(self._queue)
+            if not future.done():
+                self.waiting -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
@@ -0,0 +1,181 @@
+import asyncio
+import hashlib
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationTurn(NamedTuple):
+    # Unique per turn (derived from the Idempotency-Key when there is one, so a retried
+    # submission maps to the same turn); writing a turn twice overwrites it.
+    id: str
+    conversation_id: str
+    user_id: Optional[str]
+    message: str
+    reply: str
+    # "model", "crisis" or "cache".
+    source: str
+    created_at: str
+
+
+def stable_id(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+class ConversationSink(ABC):
+    @abstractmethod
+    async def write(self, turns: List[ConversationTurn]) -> None:
+        """Stores a batch; must be idempotent per turn id, since a failed batch is retried."""
+
+
+class InMemoryConversationSink(ConversationSink):
+    """Stands in for Firestore in tests and local runs."""
+
+    def __init__(self):
+        self.turns: Dict[str, ConversationTurn] = {}
+        self.batches = 0
+
+    async def write(self, turns: List[ConversationTurn]) -> None:
+        self.batches += 1
+        for turn in turns:
+            self.turns[turn.id] = turn
+
+
+class FirestoreConversationSink(ConversationSink):
+    """Writes turns to ``{collection}/{conversation_id}/turns/{turn_id}`` with batched writes.
+
+    Honours FIRESTORE_EMULATOR_HOST, so it can run against the local emulator.
+    """
+
+    # Firestore accepts at most 500 writes per batch.
+    BATCH_SIZE = 500
+
+    def __init__(self, collection: str = "conversations", client=None):
+        self.client = client
+        self.collection = collection
+
+    async def write(self, turns: List[ConversationTurn]) -> None:
+        if self.client is None:
+            # Imported on first flush, off the startup path.
+            from google.cloud import firestore
+            self.client = firestore.AsyncClient()
+        conversations = self.client.collection(self.collection)
+        for start in range(0, len(turns), self.BATCH_SIZE):
+            batch = self.client.batch()
+            for turn in turns[start:start + self.BATCH_SIZE]:
+                document = conversations.document(turn.conversation_id).collection("turns").document(turn.id)
+                batch.set(document, turn._asdict())
+            await batch.commit()
+
+
+class WriteBehindLog:
+    """Buffers completed turns in memory and writes them to a sink from a background task.
+
+    ``add`` never waits on the sink, so persistence stays off the request path. The buffer is
+    flushed when it reaches ``batch_size`` or every ``flush_interval`` seconds, whichever comes
+    first. A failed batch goes back to the front of the buffer and is retried on the next flush.
+    The buffer holds at most ``max_buffered`` turns; beyond that the oldest are dropped and
+    counted, which bounds memory use and the loss if the process dies. ``stop`` flushes what is
+    left, for up to ``shutdown_timeout`` seconds.
+    """
+
+    def __init__(self, sink: ConversationSink, batch_size: int = 200, flush_interval: float = 2.0,
+                 max_buffered: int = 10000, shutdown_timeout: float = 5.0):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.shutdown_timeout = shutdown_timeout
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self._buffer: "deque[ConversationTurn]" = deque()
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._buffer)
+
+    def add(self, turn: ConversationTurn):
+        self._buffer.append(turn)
+        if len(self._buffer) > self.max_buffered:
+            self._buffer.popleft()
+            self.dropped += 1
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self) -> bool:
+        """Writes everything buffered; False if a batch failed (it stays buffered)."""
+        async with self._flush_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                try:
+                    await self.sink.write(batch)
+                except BaseException as e:
+                    self._buffer.extendleft(reversed(batch))
+                    if not isinstance(e, Exception):
+                        # Cancelled (e.g. the shutdown timeout): keep the batch for the final count.
+                        raise
+                    self.write_errors += 1
+                    # Turns added during the failed write may have pushed the buffer over its cap.
+                    while len(self._buffer) > self.max_buffered:
+                        self._buffer.popleft()
+                        self.dropped += 1
+                    logger.warning("Error writing %d conversation turns, will retry: %s", len(batch), e)
+                    return False
+                self.written += len(batch)
+            return True
+
+    async def _flush_forever(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if not await self.flush():
+                # Back off instead of hammering a failing sink on every new turn.
+                await asyncio.sleep(self.flush_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        try:
+            await asyncio.wait_for(self.flush(), timeout=self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            pass
+        if self._buffer:
+            logger.error("Shutting down with %d conversation turns not persisted.", len(self._buffer))
+
+
+def create_conversation_log() -> Optional[WriteBehindLog]:
+    """Returns None unless CONVERSATION_LOG is ``memory`` or ``firestore``."""
+    backend = os.getenv("CONVERSATION_LOG", "off")
+    if backend == "off":
+        return None
+    if backend == "memory":
+        sink = InMemoryConversationSink()
+    elif backend == "firestore":
+        sink = FirestoreConversationSink(os.getenv("CONVERSATION_COLLECTION", "conversations"))
+    else:
+        raise ValueError(f"Unknown CONVERSATION_LOG: {backend}")
+    return WriteBehindLog(
+        sink,
+        batch_size=int(os.getenv("CONVERSATION_LOG_BATCH_SIZE", "200")),
+        flush_interval=float(os.getenv("CONVERSATION_LOG_FLUSH_SECONDS", "2")),
+        max_buffered=int(os.getenv("CONVERSATION_LOG_MAX_BUFFERED", "10000")),
+    )
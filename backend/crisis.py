@@ -0,0 +1,113 @@
+import os
+import re
+import unicodedata
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(__file__), "crisis_phrases.txt")
+
+# Common character substitutions used to dodge keyword filters ("k1ll mys3lf").
+_LEET = str.maketrans({"0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "@": "a", "$": "s"})
+_SEPARATORS = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize(text: str) -> str:
+    """Folds case, compatibility forms, accents, leetspeak and punctuation.
+
+    The result starts and ends with a space, so a phrase can be required to start or end at a
+    word boundary by padding it with one.
+    """
+    text = unicodedata.normalize("NFKD", text).casefold().translate(_LEET)
+    if not text.isascii():
+        text = "".join(char for char in text if not unicodedata.combining(char))
+    return " " + _SEPARATORS.sub(" ", text).strip() + " "
+
+
+def phrase_pattern(phrase: str) -> str:
+    """Normalised search pattern for a configured phrase.
+
+    Phrases match whole words only. A leading ``*`` lets the phrase start inside a word
+    ("*kill myself" matches "ikill myself"); a trailing ``*`` lets it end inside one, for stems
+    ("self harm*" matches "self harming" and "self harmed").
+    """
+    pattern = normalize(phrase.strip("*"))
+    if phrase.startswith("*"):
+        pattern = pattern.lstrip()
+    if phrase.endswith("*"):
+        pattern = pattern.rstrip()
+    return pattern
+
+
+class CrisisDetector:
+    """Aho-Corasick automaton over normalised crisis phrases.
+
+    Built once at startup; each check is a single pass over the normalised message, so its
+    cost depends on the message length and not on how many phrases are configured.
+    """
+
+    def __init__(self, phrases: Iterable[str]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Optional[str]] = [None]
+        self.phrase_count = 0
+
+        for phrase in phrases:
+            pattern = phrase_pattern(phrase)
+            if pattern.strip():
+                self._add(pattern, phrase)
+        self._build_failure_links()
+
+    def _add(self, pattern: str, phrase: str):
+        node = 0
+        for char in pattern:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._goto[node][char] = next_node
+            node = next_node
+        if self._output[node] is None:
+            self._output[node] = phrase
+            self.phrase_count += 1
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Only "is there a match" matters, so inherit the suffix's output up front.
+                if self._output[child] is None:
+                    self._output[child] = self._output[self._fail[child]]
+
+    def find(self, message: str) -> Optional[str]:
+        """Returns the configured phrase found in ``message``, or None."""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for char in normalize(message):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node] is not None:
+                return output[node]
+        return None
+
+    def matches(self, message: str) -> bool:
+        return self.find(message) is not None
+
+
+def load_phrases(path: str) -> List[str]:
+    """Reads one phrase per line; blank lines and lines starting with '#' are ignored."""
+    with open(path, encoding="utf-8") as phrases_file:
+        return [line.strip() for line in phrases_file if line.strip() and not line.lstrip().startswith("#")]
+
+
+def create_crisis_detector() -> CrisisDetector:
+    return CrisisDetector(load_phrases(os.getenv("CRISIS_PHRASES_PATH", DEFAULT_PHRASES_PATH)))
@@ -0,0 +1,145 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# (previous summary, turns to fold in) -> new summary
+Summarizer = Callable[[str, List[Dict]], Awaitable[str]]
+
+SUMMARY_PREAMBLE = "Summary of our earlier conversation: "
+SUMMARY_ACK = "Thank you, I'll keep that in mind."
+
+
+def estimate_tokens(text: str) -> int:
+    # Gemini averages roughly four characters per token for English text.
+    return len(text) // 4 + 1
+
+
+def turn_tokens(turn: Dict) -> int:
+    return sum(estimate_tokens(part) for part in turn["parts"])
+
+
+def history_digest(turns: List[Dict], *scope: str) -> str:
+    digest = hashlib.sha256()
+    for value in scope:
+        digest.update(value.encode("utf-8") + b"\x00")
+    for turn in turns:
+        digest.update(turn["role"].encode("utf-8") + b"\x01")
+        for part in turn["parts"]:
+            digest.update(part.encode("utf-8") + b"\x00")
+        digest.update(b"\x02")
+    return digest.hexdigest()
+
+
+def conversation_key(session_id: Optional[str], user_id: Optional[str], history: List[Dict]) -> Optional[str]:
+    """Key for a conversation's summary, or None when it can't be tied to a session or user.
+
+    Clients that re-send the whole transcript are keyed by user id and opening exchange, so a
+    user can have several conversations. Anonymous clients get no key: openers like "hi" are
+    shared between users, and a summary must never reach another user's prompt.
+    """
+    if session_id:
+        return session_id
+    if not user_id:
+        return None
+    return history_digest(history[:2], "user", user_id)
+
+
+class _Summary:
+    __slots__ = ("covered_turns", "covered_digest", "text")
+
+    def __init__(self):
+        self.covered_turns = 0
+        # Digest of the exact turns the summary covers; it is only reused for a history that
+        # starts with them.
+        self.covered_digest = history_digest([])
+        self.text = ""
+
+
+class HistoryWindow:
+    """Keeps the history sent to the model within a token budget.
+
+    The most recent turns that fit the budget are sent verbatim. Older turns are folded into a
+    rolling summary that is cached per conversation and extended incrementally by a background
+    task, so a request never waits on summarisation. Until the summary catches up, turns that are
+    neither in the window nor in the summary yet are left out of that request. Conversations
+    without a key get the window alone: older turns are dropped rather than summarised.
+    """
+
+    def __init__(self, token_budget: int, summarizer: Summarizer, max_conversations: int = 10000):
+        self.token_budget = token_budget
+        self.summarizer = summarizer
+        self.max_conversations = max_conversations
+        self._summaries: "OrderedDict[str, _Summary]" = OrderedDict()
+        self._pending: Dict[str, asyncio.Task] = {}
+
+    def prepare(self, key: Optional[str], history: List[Dict]) -> List[Dict]:
+        """Returns the history to send; without a key only the recent turns, with no summary."""
+        if self.token_budget <= 0:
+            return history
+
+        split = self._window_start(history)
+        if split == 0:
+            return history
+        if key is None:
+            return history[split:]
+
+        summary = self._summaries.get(key)
+        if summary is not None and not self._covers_prefix(summary, history):
+            # A different (or edited) conversation under the same key; start over. A summary task
+            # still running for the old one updates the discarded object.
+            summary = None
+        if summary is None:
+            summary = self._summaries[key] = _Summary()
+            self._summaries.move_to_end(key)
+            while len(self._summaries) > self.max_conversations:
+                self._summaries.popitem(last=False)
+        else:
+            self._summaries.move_to_end(key)
+
+        if summary.covered_turns < split and key not in self._pending:
+            task = asyncio.create_task(
+                self._extend_summary(summary, history[summary.covered_turns:split], split, history_digest(history[:split]))
+            )
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+
+        recent = history[split:]
+        if not summary.text:
+            return recent
+        return [
+            {"role": "user", "parts": [SUMMARY_PREAMBLE + summary.text]},
+            {"role": "model", "parts": [SUMMARY_ACK]},
+        ] + recent
+
+    @staticmethod
+    def _covers_prefix(summary: _Summary, history: List[Dict]) -> bool:
+        return (summary.covered_turns <= len(history)
+                and history_digest(history[:summary.covered_turns]) == summary.covered_digest)
+
+    def _window_start(self, history: List[Dict]) -> int:
+        used = 0
+        start = len(history)
+        for index in range(len(history) - 1, -1, -1):
+            used += turn_tokens(history[index])
+            if used > self.token_budget:
+                break
+            start = index
+        # Gemini expects the history to open with a user turn.
+        while start < len(history) and history[start]["role"] != "user":
+            start += 1
+        return start
+
+    async def _extend_summary(self, summary: _Summary, turns: List[Dict], covered_turns: int, covered_digest: str):
+        try:
+            text = await self.summarizer(summary.text, turns)
+        except Exception as e:
+            logger.warning("Error while summarising conversation history: %s", e)
+            return
+        if text:
+            summary.text = text
+            summary.covered_turns = covered_turns
+            summary.covered_digest = covered_digest
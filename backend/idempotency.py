@@ -0,0 +1,118 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class Abandoned(Exception):
+    """The request that owned a key went away before producing a result."""
+
+
+class IdempotencyMismatch(Exception):
+    """A key was reused for a request with different content."""
+
+
+class IdempotencyStore:
+    """Single-flight de-duplication of requests by idempotency key, plus a short memory of results.
+
+    The first request with a key owns it and produces the result; requests with the same key that
+    arrive meanwhile wait for that result instead of doing the work again. Completed results are
+    kept for ``ttl_seconds`` (at most ``max_entries`` of them, least recently used evicted first),
+    so late retries are answered without a new model call. Failures are shared with waiting
+    requests but not remembered. If the owner is abandoned, one of the waiters takes over.
+
+    Each key carries a fingerprint of the request that claimed it; reusing the key with another
+    fingerprint raises ``IdempotencyMismatch`` instead of answering with someone else's result.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # Requests answered from a completed result, and requests that waited on one in flight.
+        self.replayed = 0
+        self.joined = 0
+        self._pending: Dict[str, Tuple[asyncio.Future, str]] = {}
+        self._done: "OrderedDict[str, Tuple[float, str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._done)
+
+    async def join(self, key: str, fingerprint: str = "") -> Tuple[bool, Any]:
+        """Returns ``(True, result)`` for a completed or in-flight key. Otherwise ``(False, None)``:
+        the caller now owns the key and must ``finish`` or ``fail`` it."""
+        while True:
+            done = self._done.get(key)
+            if done is not None:
+                if time.monotonic() - done[0] <= self.ttl_seconds:
+                    if done[1] != fingerprint:
+                        raise IdempotencyMismatch(key)
+                    self.replayed += 1
+                    self._done.move_to_end(key)
+                    return True, done[2]
+                del self._done[key]
+            if key not in self._pending:
+                self._pending[key] = (asyncio.get_running_loop().create_future(), fingerprint)
+                return False, None
+            pending, claimed_fingerprint = self._pending[key]
+            if claimed_fingerprint != fingerprint:
+                raise IdempotencyMismatch(key)
+            self.joined += 1
+            try:
+                return True, await asyncio.shield(pending)
+            except Abandoned:
+                continue
+
+    def finish(self, key: str, result: Any, remember: bool = True):
+        if key not in self._pending:
+            return
+        pending, fingerprint = self._pending.pop(key)
+        if remember:
+            self._done[key] = (time.monotonic(), fingerprint, result)
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+        if not pending.done():
+            pending.set_result(result)
+
+    def fail(self, key: str, error: BaseException):
+        """Releases the key; waiters get ``error``, or take over if the owner was cancelled.
+        A no-op once the key is finished."""
+        if key not in self._pending:
+            return
+        pending, _ = self._pending.pop(key)
+        if pending.done():
+            return
+        pending.set_exception(error if isinstance(error, Exception) else Abandoned())
+        # Marks the exception as retrieved, so asyncio doesn't log it when nobody was waiting.
+        pending.exception()
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]],
+                  remember: Callable[[Any], bool] = lambda result: True, fingerprint: str = "") -> Any:
+        """Returns the result for ``key``, calling ``compute`` only if no other request has.
+
+        ``compute`` runs in its own task, so it completes for the requests waiting on it even if
+        the request that started it is cancelled.
+        """
+        found, result = await self.join(key, fingerprint)
+        if found:
+            return result
+        task = asyncio.ensure_future(compute())
+
+        def settle(task: asyncio.Task):
+            if task.cancelled():
+                self.fail(key, asyncio.CancelledError())
+            elif task.exception() is not None:
+                self.fail(key, task.exception())
+            else:
+                self.finish(key, task.result(), remember(task.result()))
+
+        task.add_done_callback(settle)
+        return await asyncio.shield(task)
+
+
+def create_idempotency_store() -> IdempotencyStore:
+    return IdempotencyStore(
+        max_entries=int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000")),
+        ttl_seconds=float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600")),
+    )
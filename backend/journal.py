@@ -0,0 +1,375 @@
+import asyncio
+import base64
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from bisect import bisect_left, bisect_right, insort
+from datetime import datetime, timezone
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class JournalEntry(NamedTuple):
+    id: str
+    title: str
+    mood: str
+    text: str
+    created_at: str
+    updated_at: str
+    # Number of times the entry was written; clients send it back as base_version when editing.
+    version: int
+    # The user's change counter when the entry was last written; drives delta sync.
+    seq: int
+
+
+class JournalConflict(Exception):
+    """Raised when an edit was based on an older version of the entry than the stored one."""
+
+    def __init__(self, current: JournalEntry):
+        super().__init__(f"Entry {current.id} is at version {current.version}.")
+        self.current = current
+
+
+class ChangeSet(NamedTuple):
+    entries: List[JournalEntry]
+    # Pass back as ``since`` on the next sync.
+    version: int
+    has_more: bool
+
+
+def timestamp(when: Optional[datetime] = None) -> str:
+    """UTC ISO-8601 with a fixed width, so timestamps sort correctly as strings."""
+    when = (when or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return when.strftime("%Y-%m-%dT%H:%M:%S.") + f"{when.microsecond // 1000:03d}Z"
+
+
+def encode_cursor(entry: JournalEntry) -> str:
+    return base64.urlsafe_b64encode(json.dumps([entry.created_at, entry.id]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Raises ValueError for a malformed cursor."""
+    try:
+        created_at, entry_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor.")
+    return str(created_at), str(entry_id)
+
+
+class JournalStore(ABC):
+    """Per-user journal storage.
+
+    Every write bumps a per-user change counter and stamps it on the entry as ``seq``. A client
+    that remembers the highest counter it has seen (the version returned by ``changes``) can
+    ask for just the entries written since, so a sync costs O(changes), not O(journal size).
+
+    Versions only mean something within one ``epoch``, which identifies the underlying data:
+    a store that starts empty again (a fresh in-memory store, a new SQLite file) gets a new
+    epoch, and a client holding a version from another epoch has to sync from 0.
+    """
+
+    epoch: str
+
+    @abstractmethod
+    async def append(self, user_id: str, entry_id: Optional[str], title: str, mood: str, text: str,
+                     created_at: Optional[str] = None) -> JournalEntry:
+        """Adds an entry. Appending an id that already exists returns the stored entry unchanged,
+        so clients can safely retry uploads."""
+
+    @abstractmethod
+    async def update(self, user_id: str, entry_id: str, changes: Dict[str, str],
+                     base_version: Optional[int] = None) -> Optional[JournalEntry]:
+        """Edits title/mood/text; None if the entry doesn't exist. Raises JournalConflict if
+        ``base_version`` is given and the entry has moved on."""
+
+    @abstractmethod
+    async def page(self, user_id: str, limit: int, cursor: Optional[str] = None) -> Tuple[List[JournalEntry], Optional[str]]:
+        """Newest entries first; returns the page and the cursor for the next one (None at the end)."""
+
+    @abstractmethod
+    async def changes(self, user_id: str, since: int, limit: int) -> ChangeSet:
+        """Entries written after change ``since``, oldest change first."""
+
+
+def _new_entry(entry_id: Optional[str], title: str, mood: str, text: str, created_at: Optional[str], seq: int) -> JournalEntry:
+    now = timestamp()
+    return JournalEntry(entry_id or uuid.uuid4().hex, title, mood, text, created_at or now, now, 1, seq)
+
+
+def _edited(entry: JournalEntry, changes: Dict[str, str], seq: int) -> JournalEntry:
+    return entry._replace(**changes, updated_at=timestamp(), version=entry.version + 1, seq=seq)
+
+
+class _UserJournal:
+    def __init__(self):
+        self.entries: Dict[str, JournalEntry] = {}
+        self.seq = 0
+        # (created_at, id) of every entry, ascending.
+        self.order: List[Tuple[str, str]] = []
+        # Parallel change log; an id appears again each time it is edited, stale rows are skipped.
+        self.change_seqs: List[int] = []
+        self.change_ids: List[str] = []
+
+    def write(self, entry: JournalEntry):
+        self.entries[entry.id] = entry
+        self.change_seqs.append(entry.seq)
+        self.change_ids.append(entry.id)
+        if len(self.change_seqs) > 2 * len(self.entries) + 64:
+            live = sorted((e.seq, e.id) for e in self.entries.values())
+            self.change_seqs = [seq for seq, _ in live]
+            self.change_ids = [entry_id for _, entry_id in live]
+
+
+class InMemoryJournalStore(JournalStore):
+    """Per-process store for tests and local runs."""
+
+    def __init__(self):
+        self._users: Dict[str, _UserJournal] = {}
+        # Everything is lost on restart, so every process is a new epoch.
+        self.epoch = uuid.uuid4().hex
+
+    def _user(self, user_id: str) -> _UserJournal:
+        journal = self._users.get(user_id)
+        if journal is None:
+            journal = self._users[user_id] = _UserJournal()
+        return journal
+
+    async def append(self, user_id, entry_id, title, mood, text, created_at=None):
+        journal = self._user(user_id)
+        if entry_id in journal.entries:
+            return journal.entries[entry_id]
+        journal.seq += 1
+        entry = _new_entry(entry_id, title, mood, text, created_at, journal.seq)
+        journal.write(entry)
+        insort(journal.order, (entry.created_at, entry.id))
+        return entry
+
+    async def update(self, user_id, entry_id, changes, base_version=None):
+        journal = self._user(user_id)
+        entry = journal.entries.get(entry_id)
+        if entry is None:
+            return None
+        if base_version is not None and base_version != entry.version:
+            raise JournalConflict(entry)
+        journal.seq += 1
+        entry = _edited(entry, changes, journal.seq)
+        journal.write(entry)
+        return entry
+
+    async def page(self, user_id, limit, cursor=None):
+        journal = self._user(user_id)
+        end = bisect_left(journal.order, decode_cursor(cursor)) if cursor else len(journal.order)
+        keys = journal.order[max(0, end - limit):end][::-1]
+        entries = [journal.entries[entry_id] for _, entry_id in keys]
+        more = end - limit > 0
+        return entries, encode_cursor(entries[-1]) if entries and more else None
+
+    async def changes(self, user_id, since, limit):
+        journal = self._user(user_id)
+        entries = []
+        index = bisect_right(journal.change_seqs, since)
+        while index < len(journal.change_seqs) and len(entries) < limit:
+            entry = journal.entries[journal.change_ids[index]]
+            if entry.seq == journal.change_seqs[index]:
+                entries.append(entry)
+            index += 1
+        # May be a false positive if only stale rows remain; the next call then returns nothing.
+        has_more = len(entries) == limit and index < len(journal.change_seqs)
+        version = entries[-1].seq if has_more else journal.seq
+        return ChangeSet(entries, max(version, since), has_more)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS journal_entries (
+    user_id TEXT NOT NULL, id TEXT NOT NULL, title TEXT NOT NULL, mood TEXT NOT NULL, text TEXT NOT NULL,
+    created_at TEXT NOT NULL, updated_at TEXT NOT NULL, version INTEGER NOT NULL, seq INTEGER NOT NULL,
+    PRIMARY KEY (user_id, id)
+);
+CREATE INDEX IF NOT EXISTS journal_entries_by_seq ON journal_entries (user_id, seq);
+CREATE INDEX IF NOT EXISTS journal_entries_by_created ON journal_entries (user_id, created_at, id);
+CREATE TABLE IF NOT EXISTS journal_users (user_id TEXT PRIMARY KEY, seq INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS journal_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+_ENTRY_COLUMNS = "id, title, mood, text, created_at, updated_at, version, seq"
+
+
+class SQLiteJournalStore(JournalStore):
+    """Single-file store for local runs and tests; queries run in a worker thread."""
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SQLITE_SCHEMA)
+        # Created with the file, so it changes only if the database is replaced.
+        self._db.execute("INSERT OR IGNORE INTO journal_meta (key, value) VALUES ('epoch', ?)", (uuid.uuid4().hex,))
+        self.epoch = self._db.execute("SELECT value FROM journal_meta WHERE key = 'epoch'").fetchone()[0]
+        self._lock = threading.Lock()
+
+    def _run(self, operation, *args):
+        def locked():
+            with self._lock:
+                return operation(*args)
+        return asyncio.to_thread(locked)
+
+    def _get(self, user_id: str, entry_id: str) -> Optional[JournalEntry]:
+        row = self._db.execute(f"SELECT {_ENTRY_COLUMNS} FROM journal_entries WHERE user_id = ? AND id = ?", (user_id, entry_id)).fetchone()
+        return JournalEntry(*row) if row else None
+
+    def _next_seq(self, user_id: str) -> int:
+        self._db.execute("INSERT INTO journal_users VALUES (?, 1) ON CONFLICT (user_id) DO UPDATE SET seq = seq + 1", (user_id,))
+        return self._db.execute("SELECT seq FROM journal_users WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def _save(self, user_id: str, entry: JournalEntry):
+        self._db.execute(f"INSERT OR REPLACE INTO journal_entries (user_id, {_ENTRY_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", (user_id, *entry))
+
+    def _append(self, user_id, entry_id, title, mood, text, created_at):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            existing = self._get(user_id, entry_id) if entry_id else None
+            if existing:
+                return existing
+            entry = _new_entry(entry_id, title, mood, text, created_at, self._next_seq(user_id))
+            self._save(user_id, entry)
+            return entry
+
+    def _update(self, user_id, entry_id, changes, base_version):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            entry = self._get(user_id, entry_id)
+            if entry is None:
+                return None
+            if base_version is not None and base_version != entry.version:
+                raise JournalConflict(entry)
+            entry = _edited(entry, changes, self._next_seq(user_id))
+            self._save(user_id, entry)
+            return entry
+
+    def _page(self, user_id, limit, cursor):
+        query = f"SELECT {_ENTRY_COLUMNS} FROM journal_entries WHERE user_id = ?"
+        params: list = [user_id]
+        if cursor:
+            query += " AND (created_at, id) < (?, ?)"
+            params += decode_cursor(cursor)
+        rows = self._db.execute(query + " ORDER BY created_at DESC, id DESC LIMIT ?", (*params, limit + 1)).fetchall()
+        entries = [JournalEntry(*row) for row in rows[:limit]]
+        return entries, encode_cursor(entries[-1]) if len(rows) > limit else None
+
+    def _changes(self, user_id, since, limit):
+        rows = self._db.execute(
+            f"SELECT {_ENTRY_COLUMNS} FROM journal_entries WHERE user_id = ? AND seq > ? ORDER BY seq LIMIT ?",
+            (user_id, since, limit + 1),
+        ).fetchall()
+        entries = [JournalEntry(*row) for row in rows[:limit]]
+        if len(rows) > limit:
+            return ChangeSet(entries, entries[-1].seq, True)
+        row = self._db.execute("SELECT seq FROM journal_users WHERE user_id = ?", (user_id,)).fetchone()
+        return ChangeSet(entries, max(row[0] if row else 0, since), False)
+
+    async def append(self, user_id, entry_id, title, mood, text, created_at=None):
+        return await self._run(self._append, user_id, entry_id, title, mood, text, created_at)
+
+    async def update(self, user_id, entry_id, changes, base_version=None):
+        return await self._run(self._update, user_id, entry_id, changes, base_version)
+
+    async def page(self, user_id, limit, cursor=None):
+        return await self._run(self._page, user_id, limit, cursor)
+
+    async def changes(self, user_id, since, limit):
+        return await self._run(self._changes, user_id, since, limit)
+
+
+class FirestoreJournalStore(JournalStore):
+    """Stores entries under ``{collection}/{user_id}/entries/{entry_id}``.
+
+    The user document holds the change counter, and every write updates it and the entry in
+    one transaction. Honours FIRESTORE_EMULATOR_HOST. Delta sync needs a single-field index on
+    ``seq`` (created automatically); pagination needs a composite index on
+    ``created_at DESC, id DESC``.
+    """
+
+    def __init__(self, collection: str = "journals", client=None):
+        self.client = client
+        self.collection = collection
+        # The data outlives deploys; only pointing at another collection starts over.
+        self.epoch = f"firestore:{collection}"
+
+    def _user_ref(self, user_id: str):
+        if self.client is None:
+            # Imported on first use, off the startup path.
+            from google.cloud import firestore
+            self.client = firestore.AsyncClient()
+        return self.client.collection(self.collection).document(user_id)
+
+    async def _write(self, user_id: str, entry_id: str, build):
+        """Runs ``build(existing_entry, next_seq)`` in a transaction; it returns the entry to store
+        (or the existing one / None to write nothing)."""
+        from google.cloud import firestore
+
+        user_ref = self._user_ref(user_id)
+        entry_ref = user_ref.collection("entries").document(entry_id)
+
+        @firestore.async_transactional
+        async def run(transaction):
+            user_doc = await user_ref.get(transaction=transaction)
+            entry_doc = await entry_ref.get(transaction=transaction)
+            existing = JournalEntry(**entry_doc.to_dict()) if entry_doc.exists else None
+            seq = (user_doc.get("seq") if user_doc.exists else 0) + 1
+            entry = build(existing, seq)
+            if entry is not None and entry is not existing:
+                transaction.set(user_ref, {"seq": seq}, merge=True)
+                transaction.set(entry_ref, entry._asdict())
+            return entry
+
+        return await run(self.client.transaction())
+
+    async def append(self, user_id, entry_id, title, mood, text, created_at=None):
+        entry_id = entry_id or uuid.uuid4().hex
+        return await self._write(
+            user_id, entry_id,
+            lambda existing, seq: existing or _new_entry(entry_id, title, mood, text, created_at, seq),
+        )
+
+    async def update(self, user_id, entry_id, changes, base_version=None):
+        def build(existing, seq):
+            if existing is None:
+                return None
+            if base_version is not None and base_version != existing.version:
+                raise JournalConflict(existing)
+            return _edited(existing, changes, seq)
+        return await self._write(user_id, entry_id, build)
+
+    async def page(self, user_id, limit, cursor=None):
+        from google.cloud import firestore
+
+        query = (self._user_ref(user_id).collection("entries")
+                 .order_by("created_at", direction=firestore.Query.DESCENDING)
+                 .order_by("id", direction=firestore.Query.DESCENDING))
+        if cursor:
+            created_at, entry_id = decode_cursor(cursor)
+            query = query.start_after({"created_at": created_at, "id": entry_id})
+        entries = [JournalEntry(**doc.to_dict()) async for doc in query.limit(limit + 1).stream()]
+        return entries[:limit], encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+
+    async def changes(self, user_id, since, limit):
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        user_ref = self._user_ref(user_id)
+        query = user_ref.collection("entries").where(filter=FieldFilter("seq", ">", since)).order_by("seq").limit(limit + 1)
+        entries = [JournalEntry(**doc.to_dict()) async for doc in query.stream()]
+        if len(entries) > limit:
+            return ChangeSet(entries[:limit], entries[limit - 1].seq, True)
+        user_doc = await user_ref.get()
+        return ChangeSet(entries, max(user_doc.get("seq") if user_doc.exists else 0, since), False)
+
+
+def create_journal_store() -> JournalStore:
+    backend = os.getenv("JOURNAL_BACKEND", "memory")
+    if backend == "memory":
+        return InMemoryJournalStore()
+    if backend == "sqlite":
+        return SQLiteJournalStore(os.getenv("JOURNAL_SQLITE_PATH", "journal.db"))
+    if backend == "firestore":
+        return FirestoreJournalStore(os.getenv("JOURNAL_COLLECTION", "journals"))
+    raise ValueError(f"Unknown JOURNAL_BACKEND: {backend}")
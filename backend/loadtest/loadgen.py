@@ -0,0 +1,189 @@
+"""Load generator for the Kelvin backend.
+
+Replays multi-turn conversations against /api/chat (plus /api/quest/today traffic) at a range
+of concurrency levels and reports throughput, latency percentiles and error rates.
+
+By default it starts the backend itself with the mock model (MODEL_BACKEND=mock) and rate
+limiting disabled, once per worker count:
+
+    cd backend
+    pip install -r requirements-dev.txt
+    python loadtest/loadgen.py --workers 1,2,4 --concurrency 1,16,64,256 --duration 20
+
+Pass --url to target a server that is already running instead. Mock latency, chunking and
+error rate are set with the MOCK_* environment variables (see mock_gemini.py), which are
+passed through to the spawned servers. Fallback replies (marked with X-Fallback-Reply, e.g.
+after an upstream error or with the circuit breaker open) count as errors.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONVERSATIONS = [
+    ["hi", "i've been feeling really stressed about exams", "i can't focus when i study", "maybe i should take breaks", "thanks, that helps"],
+    ["hello", "can't sleep again", "my mind keeps racing about work", "i have a big presentation tomorrow"],
+    ["i feel sad today", "i had an argument with my best friend", "i said some things i regret", "i don't know how to apologise", "i'll try texting her tonight"],
+    ["hey kelvin", "i moved to a new city and i feel lonely", "i don't really know anyone here", "there's a book club near my place"],
+    ["i'm tired of everything lately", "work has been overwhelming", "my manager keeps adding more tasks", "i haven't had a day off in weeks", "i think i need to talk to her", "thank you for listening"],
+]
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Results:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, seconds: float, ok: bool):
+        self.latencies[endpoint].append(seconds)
+        if not ok:
+            self.errors[endpoint] += 1
+
+    def summary(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        report = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            report[endpoint] = {
+                "requests": len(values),
+                "throughput_rps": len(values) / elapsed,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "error_rate": self.errors[endpoint] / len(values),
+            }
+        return report
+
+
+async def timed_request(client: httpx.AsyncClient, results: Results, endpoint: str, method: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, endpoint, **kwargs)
+        # Upstream failures are answered with a 200 fallback reply; they are errors here.
+        ok = response.status_code < 400 and "x-fallback-reply" not in response.headers
+    except httpx.HTTPError:
+        response, ok = None, False
+    results.record(endpoint, time.perf_counter() - started, ok)
+    return response if ok else None
+
+
+async def virtual_user(client: httpx.AsyncClient, results: Results, deadline: float, quest_ratio: float, think_time: float):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        if rng.random() < quest_ratio:
+            await timed_request(client, results, "/api/quest/today", "GET")
+            continue
+
+        history = []
+        for message in rng.choice(CONVERSATIONS):
+            if time.perf_counter() >= deadline:
+                return
+            response = await timed_request(client, results, "/api/chat", "POST", json={"message": message, "chat_history": history})
+            if response is None:
+                break
+            history += [{"role": "user", "parts": [message]}, {"role": "model", "parts": [response.json()["reply"]]}]
+            if think_time:
+                await asyncio.sleep(rng.uniform(0, think_time))
+
+
+async def run_level(url: str, concurrency: int, duration: float, quest_ratio: float, think_time: float) -> Dict:
+    results = Results()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        started = time.perf_counter()
+        deadline = started + duration
+        await asyncio.gather(*(virtual_user(client, results, deadline, quest_ratio, think_time) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return results.summary(elapsed)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int, port: int) -> subprocess.Popen:
+    env = dict(os.environ, MODEL_BACKEND=os.getenv("MODEL_BACKEND", "mock"), RATE_LIMIT_SCOPES="")
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/", timeout=1).status_code == 200:
+                return process
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Backend did not start within 60 seconds.")
+
+
+def print_report(workers, concurrency: int, report: Dict):
+    for endpoint, stats in report.items():
+        print(
+            f"{str(workers):>7} {concurrency:>11} {endpoint:<18} {stats['requests']:>8} {stats['throughput_rps']:>9.1f} "
+            f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f} {stats['error_rate'] * 100:>6.2f}%"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Target an already running server instead of starting one per worker count.")
+    parser.add_argument("--workers", default="1", help="Comma-separated uvicorn worker counts to test (ignored with --url).")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated numbers of concurrent virtual users.")
+    parser.add_argument("--duration", type=float, default=15, help="Seconds per concurrency level.")
+    parser.add_argument("--quest-ratio", type=float, default=0.2, help="Share of iterations that fetch the daily quest instead of chatting.")
+    parser.add_argument("--think-time", type=float, default=0, help="Maximum random pause in seconds between chat turns.")
+    parser.add_argument("--json", help="Also write the results to this file.")
+    args = parser.parse_args()
+
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    worker_counts = [None] if args.url else [int(count) for count in args.workers.split(",")]
+
+    print(f"{'workers':>7} {'concurrency':>11} {'endpoint':<18} {'requests':>8} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    all_results = []
+    for workers in worker_counts:
+        server = None
+        url = args.url
+        if url is None:
+            port = free_port()
+            server = start_server(workers, port)
+            url = f"http://127.0.0.1:{port}"
+        try:
+            for concurrency in concurrency_levels:
+                report = asyncio.run(run_level(url, concurrency, args.duration, args.quest_ratio, args.think_time))
+                print_report(workers or "-", concurrency, report)
+                all_results.append({"workers": workers, "concurrency": concurrency, "endpoints": report})
+        finally:
+            if server is not None:
+                server.terminate()
+                server.wait()
+
+    if args.json:
+        with open(args.json, "w") as results_file:
+            json.dump(all_results, results_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
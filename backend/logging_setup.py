@@ -0,0 +1,146 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from typing import Optional
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed through `extra=` and is logged as a field.
+_STANDARD_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key not in entry:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps the current request id on the record while still on the request's task."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only ``rate`` of records below WARNING; warnings and errors are always kept."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or self.rate >= 1 or random.random() < self.rate
+
+
+def redact(text: str) -> str:
+    """Renders user or model text for logs according to LOG_MESSAGE_CONTENT.
+
+    ``redact`` (default) keeps only the length, ``truncate`` keeps the first 40 characters and
+    ``full`` keeps everything. Conversations are private, so only use ``full`` locally.
+    """
+    if _content_mode == "full":
+        return text
+    if _content_mode == "truncate":
+        return text if len(text) <= 40 else text[:40] + "..."
+    return f"<{len(text)} chars>"
+
+
+_content_mode = "redact"
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def configure_logging():
+    """Routes all logging through a queue to a background thread that writes JSON lines to stdout."""
+    global _content_mode, _listener
+    if _listener is not None:
+        return
+
+    _content_mode = os.getenv("LOG_MESSAGE_CONTENT", "redact")
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(SamplingFilter(float(os.getenv("LOG_SAMPLE_RATE", "1"))))
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def dropped_log_records() -> int:
+    return _NonBlockingQueueHandler.dropped
+
+
+def shutdown_logging():
+    """Flushes queued records; call on shutdown."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        # Never block the request path: if the writer falls behind, drop the record.
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _NonBlockingQueueHandler.dropped += 1
+
+
+class RequestIdMiddleware:
+    """ASGI middleware that assigns each request an id (or reuses X-Request-ID) and echoes it back."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((b"x-request-id", request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
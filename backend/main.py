@@ -1,37 +1,143 @@
 # 1. All imports
 import os
-import random
+import logging
+import uuid
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from contextlib import AsyncExitStack, asynccontextmanager
 from dotenv import load_dotenv
-import google.generativeai as genai
-from fastapi import FastAPI
-from pydantic import BaseModel
-from typing import List, Dict
+from fastapi import FastAPI, HTTPException, Query, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Callable, List, Dict, Literal, Optional, Tuple
 from fastapi.middleware.cors import CORSMiddleware
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
 from starlette.requests import Request
-from slowapi.errors import RateLimitExceeded
+from starlette.background import BackgroundTask
+from concurrency import PRIORITY_BACKGROUND, UpstreamLimiter, UpstreamBusy
+from sessions import create_session_store
+from journal import JournalConflict, create_journal_store, timestamp
+from conversation_log import ConversationTurn, create_conversation_log, stable_id
+from idempotency import Abandoned, IdempotencyMismatch, create_idempotency_store
+from history_window import HistoryWindow, conversation_key, estimate_tokens, turn_tokens
+from crisis import create_crisis_detector
+from reply_cache import create_reply_cache, prompt_fingerprint
+from quests import create_quest_catalogue_cache, next_utc_midnight
+from ratelimit import RateLimiter, RateLimited, create_token_bucket_store, retry_after_header
+from logging_setup import RequestIdMiddleware, configure_logging, redact, shutdown_logging, dropped_log_records
+from model_router import ModelSpec, create_model_router
+from prompts import KELVIN, SUMMARIZER, PersonaModels, strip_legacy_prefix, token_usage
+from resilience import CircuitOpen
+from metrics import REGISTRY, CallbackMetric, MetricsMiddleware, RequestTimings, model_tokens, upstream_errors
+from wire import CompressionMiddleware, FastJSONRoute, dumps
 
 # 2. Load environment variables
 load_dotenv()
+configure_logging()
+logger = logging.getLogger("kelvin")
 
 # 3. Configure Gemini API
-try:
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise ValueError("GEMINI_API_KEY not found in environment variables.")
-    genai.configure(api_key=api_key)
-    model = genai.GenerativeModel('gemini-flash-latest')
-    print("Gemini API configured successfully.")
-except Exception as e:
-    print(f"CRITICAL: Error configuring Gemini API: {e}")
-    model = None
+MODEL_NAME = 'gemini-flash-latest'
+# MODEL_BACKEND=mock swaps Gemini for the local fake in mock_gemini.py (used by loadtest/).
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "gemini")
+
+def create_model(spec: ModelSpec) -> PersonaModels:
+    # Runs in a background thread at startup; the SDK import is the slow part of a cold start.
+    if spec.backend == "mock":
+        from mock_gemini import create_mock_model
+        logger.info("Using the mock Gemini backend for %s.", spec.name)
+        models = PersonaModels(lambda instruction: create_mock_model(spec.model, instruction, **spec.options))
+    elif spec.backend == "gemini":
+        import google.generativeai as genai
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise ValueError("GEMINI_API_KEY not found in environment variables.")
+        genai.configure(api_key=api_key)
+        models = PersonaModels(lambda instruction: genai.GenerativeModel(spec.model, system_instruction=instruction, **spec.options))
+        logger.info("Gemini API configured successfully for %s.", spec.name)
+    else:
+        raise ValueError(f"Unknown model backend: {spec.backend}")
+
+    # Build the instances requests use now rather than on the first request.
+    for persona in (KELVIN, SUMMARIZER):
+        models.for_persona(persona)
+    return models
+
+# Model backends from MODEL_REGISTRY_PATH / MODEL_REGISTRY, or just MODEL_NAME on MODEL_BACKEND.
+# Each one has its own deadlines, retries and circuit breaker; the router picks one per
+# request and falls back to the next when it fails.
+model_router = create_model_router(create_model, ModelSpec(name="primary", backend=MODEL_BACKEND, model=MODEL_NAME))
+
+# Admission control for model calls: at most MAX_CONCURRENT_UPSTREAM_CALLS run at once, and
+# at most MAX_QUEUED_UPSTREAM_CALLS requests wait, in priority order, for up to
+# MAX_UPSTREAM_WAIT_SECONDS. Anything beyond that is shed with a 503 before it costs anything.
+upstream_limiter = UpstreamLimiter(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_UPSTREAM_CALLS", "64")),
+    max_waiting=int(os.getenv("MAX_QUEUED_UPSTREAM_CALLS", "256")),
+    max_wait_seconds=float(os.getenv("MAX_UPSTREAM_WAIT_SECONDS", "10")),
+)
+
+# Server-side conversation history for clients that use /api/session.
+session_store = create_session_store()
+
+# Opt-in (CONVERSATION_LOG) record of completed turns, written behind the request in batches.
+conversation_log = create_conversation_log()
+
+# Journal entries, keyed by the X-User-Id header (JOURNAL_BACKEND: memory, sqlite or firestore).
+journal_store = create_journal_store()
 
 # 4. Create FastAPI app instance
-limiter = Limiter(key_func=get_remote_address)
-app = FastAPI()
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    model_router.start()
+    quest_catalogue.start()
+    if conversation_log is not None:
+        conversation_log.start()
+    yield
+    await quest_catalogue.stop()
+    if conversation_log is not None:
+        await conversation_log.stop()
+    shutdown_logging()
+
+app = FastAPI(lifespan=lifespan)
+# Parses request bodies with orjson; must be set before the routes below are declared.
+app.router.route_class = FastJSONRoute
+
+# Token-bucket rate limits, shared across workers when RATE_LIMIT_STORE=redis.
+# A request consumes one token from the bucket of every scope in RATE_LIMIT_SCOPES it has:
+# `ip`, `user` (X-User-Id header) and `session` (session_id of a chat request).
+rate_limit_store = create_token_bucket_store()
+rate_limit_scopes = [scope.strip() for scope in os.getenv("RATE_LIMIT_SCOPES", "ip,user,session").split(",") if scope.strip()]
+chat_rate_limiter = RateLimiter(
+    "chat",
+    rate_limit_store,
+    capacity=float(os.getenv("CHAT_RATE_LIMIT_BURST", "20")),
+    refill_per_second=float(os.getenv("CHAT_RATE_LIMIT_PER_MINUTE", "20")) / 60,
+)
+session_rate_limiter = RateLimiter("session", rate_limit_store, capacity=20, refill_per_second=20 / 60)
+
+def rate_limit_keys(request: Request, session_id: Optional[str] = None) -> List[str]:
+    keys = []
+    if "ip" in rate_limit_scopes:
+        keys.append(f"ip:{request.client.host if request.client else 'unknown'}")
+    user_id = request.headers.get("x-user-id")
+    if "user" in rate_limit_scopes and user_id:
+        keys.append(f"user:{user_id}")
+    if "session" in rate_limit_scopes and session_id:
+        keys.append(f"session:{session_id}")
+    return keys
+
+async def enforce_rate_limit(rate_limiter: RateLimiter, request: Request, session_id: Optional[str] = None):
+    keys = rate_limit_keys(request, session_id)
+    if not keys:
+        return
+    try:
+        await rate_limiter.hit(keys)
+    except RateLimited as e:
+        raise HTTPException(
+            status_code=429,
+            detail="You're sending messages a little too quickly. Please wait a moment.",
+            headers={"Retry-After": retry_after_header(e.retry_after)},
+        )
 
 # 5. Add CORS middleware
 origins = [
@@ -42,6 +148,13 @@ origins = [
     "https://kelvin-mental-health-bot-git-master-dhairyas-projects-15111569.vercel.app",
     "https://kelvin-mental-health-hujv9bgoq-dhairyas-projects-15111569.vercel.app",
 ]
+# Added before CORS so that it runs inside it, and its 413/415 errors carry CORS headers.
+# Responses under COMPRESSION_MIN_BYTES (e.g. quests) are sent as is; SSE is never compressed.
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+    max_request_bytes=int(os.getenv("MAX_DECOMPRESSED_REQUEST_BYTES", str(5 * 1024 * 1024))),
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -49,6 +162,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(RequestIdMiddleware)
+app.add_middleware(MetricsMiddleware, tracked_paths=["/api/chat", "/api/chat/stream", "/api/quest/today", "/api/session"])
 
 # 6. Define Pydantic Data Models
 class ChatMessage(BaseModel):
@@ -57,62 +172,580 @@ class ChatMessage(BaseModel):
 
 class ChatRequest(BaseModel):
     message: str
-    chat_history: List[ChatMessage]
+    # Older clients send the whole transcript; session clients send only session_id.
+    chat_history: List[ChatMessage] = []
+    session_id: Optional[str] = None
+
+class TokenUsage(BaseModel):
+    prompt_tokens: int
+    reply_tokens: int
+    cached_tokens: int
+    total_tokens: int
 
 class ChatResponse(BaseModel):
     reply: str
+    # Reported by the model; absent for crisis, cached and fallback replies.
+    usage: Optional[TokenUsage] = None
+
+class SessionCreateRequest(BaseModel):
+    chat_history: List[ChatMessage] = []
+
+class SessionResponse(BaseModel):
+    session_id: str
 
 class QuestResponse(BaseModel):
     id: str
     text: str
 
+class JournalEntryCreate(BaseModel):
+    # Client-generated ids make retried uploads idempotent.
+    id: Optional[str] = Field(None, min_length=1, max_length=64)
+    title: str = Field(..., max_length=200)
+    mood: Literal["Happy", "Neutral", "Sad"] = "Neutral"
+    text: str = Field(..., max_length=20000)
+    # Lets clients upload entries written offline (or before sync existed) with their original date.
+    created_at: Optional[datetime] = None
+
+class JournalEntryUpdate(BaseModel):
+    title: Optional[str] = Field(None, max_length=200)
+    mood: Optional[Literal["Happy", "Neutral", "Sad"]] = None
+    text: Optional[str] = Field(None, max_length=20000)
+    # The version the edit was based on; a mismatch is rejected with 409.
+    base_version: Optional[int] = None
+
+class JournalEntryResponse(BaseModel):
+    id: str
+    title: str
+    mood: str
+    text: str
+    created_at: str
+    updated_at: str
+    version: int
+    seq: int
+
+class JournalPageResponse(BaseModel):
+    entries: List[JournalEntryResponse]
+    next_cursor: Optional[str]
+
+class JournalChangesResponse(BaseModel):
+    entries: List[JournalEntryResponse]
+    version: int
+    # Identifies the store's data; send it back with `version`.
+    epoch: str
+    has_more: bool
+
 # 7. Define API Endpoints
-system_instruction = """You are Kelvin, a supportive and empathetic companion. Your goal is to be a good listener and provide a safe space for users to reflect. Keep your responses concise (2-3 sentences). Do not give unsolicited advice. Your tone should be warm, encouraging, and gentle."""
+# The Kelvin system instruction lives in prompts.py and is set on the model, not on each message.
 
 @app.get("/")
 def read_root():
     return {"message": "Kelvin Backend is running."}
 
+# Liveness: the process is up and serving requests.
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: at least one model backend has finished initialising successfully.
+@app.get("/readyz")
+async def readyz():
+    body = {
+        "status": "ready" if model_router.ready else "not_ready",
+        "models": [
+            {"name": backend.name, "backend": backend.spec.backend, "model": backend.spec.model, "state": backend.client.state,
+             "error": backend.client.error, "init_seconds": backend.client.init_seconds, "circuit": backend.caller.breaker.state}
+            for backend in model_router.backends
+        ],
+        "quests": {"count": len(quest_catalogue.current), "last_refresh_error": quest_catalogue.last_refresh_error},
+    }
+    return JSONResponse(body, status_code=200 if model_router.ready else 503)
+
+# Prometheus text exposition of the metrics in metrics.py plus the counters kept by
+# the limiters and caches below.
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+# Served from memory; refreshed in the background from QUEST_SOURCE (see lifespan).
+quest_catalogue = create_quest_catalogue_cache()
+
+# The quest is fixed for the UTC day (and optionally per user), so responses can be cached
+# by browsers and the CDN until midnight UTC and revalidated with If-None-Match.
 @app.get("/api/quest/today", response_model=QuestResponse)
-def get_daily_quest():
-    quests = [
-        "Take 5 deep, slow breaths.",
-        "Write down one thing you are grateful for today.",
-        "Step outside for 60 seconds of fresh air.",
-        "Listen to one full song without any other distractions.",
-        "Stretch your arms and back for 30 seconds.",
-        "Drink a full glass of water.",
-        "Tidy up one small area of your room.",
-        "Send a positive message to a friend.",
-        "Think of a happy memory for a moment.",
-        "Look out a window and notice 3 details you haven't before."
-    ]
-    chosen_quest = random.choice(quests)
-    return QuestResponse(id=str(hash(chosen_quest)), text=chosen_quest)
+async def get_daily_quest(request: Request, response: Response, user_id: Optional[str] = None):
+    timings = RequestTimings(request, "quest")
+    with timings.stage("select"):
+        now = datetime.now(timezone.utc)
+        quest = quest_catalogue.current.for_day(now.date(), user_id)
+        expires = next_utc_midnight(now)
 
-@app.post("/api/chat", response_model=ChatResponse)
-@limiter.limit("20/minute")
-def post_chat(request: Request, chat_request: ChatRequest):
-    print(f"GEMINI_API_KEY loaded: {os.getenv('GEMINI_API_KEY') is not None}")
-    user_message = chat_request.message.lower()
-    crisis_keywords = ["kill myself", "want to die", "self harm"]
-    if any(keyword in user_message for keyword in crisis_keywords):
-        return ChatResponse(
-            reply="It sounds like you are in crisis. Please reach out for help. You can connect with people who can support you by calling or texting 988 anytime in the US and Canada. In the UK, you can call 111."
-        )
+    etag = f'"{quest.id}-{now.date():%Y%m%d}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"{'private' if user_id else 'public'}, max-age={int((expires - now).total_seconds())}",
+        "Expires": format_datetime(expires, usegmt=True),
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if if_none_match == "*" or etag in (tag.strip() for tag in if_none_match.split(",")):
+        timings.handler_done()
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    timings.handler_done()
+    return QuestResponse(id=quest.id, text=quest.text)
+
+CRISIS_REPLY = "It sounds like you are in crisis. Please reach out for help. You can connect with people who can support you by calling or texting 988 anytime in the US and Canada. In the UK, you can call 111."
+MODEL_NOT_CONFIGURED_REPLY = "Sorry, the AI model is not configured correctly. Please check the server logs."
+UPSTREAM_ERROR_REPLY = "Sorry, I had trouble connecting to the AI model."
+# Served without calling Gemini while every backend's circuit breaker is open.
+UPSTREAM_UNAVAILABLE_REPLY = "I'm having a little trouble thinking clearly right now, but I'm still here with you. Maybe take a slow breath with me, and try again in a minute. If you need to talk to someone right away, you can call or text 988 in the US and Canada, or call 111 in the UK."
+
+def send_chat_message(history: List[Dict], message: str, **kwargs):
+    """Call factory for model_router: every attempt (retry, hedge or fallback) gets a fresh chat session."""
+    def for_models(models: PersonaModels):
+        def send():
+            return models.for_persona(KELVIN).start_chat(history=history).send_message_async(message, **kwargs)
+        return send
+    return for_models
+
+def conversation_tokens(history: List[Dict], message: str) -> int:
+    return estimate_tokens(KELVIN.system_instruction) + sum(turn_tokens(turn) for turn in history) + estimate_tokens(message)
+
+def record_usage(endpoint: str, response) -> Optional[TokenUsage]:
+    usage = token_usage(response)
+    if usage is None:
+        return None
+    for kind in ("prompt", "reply", "cached"):
+        model_tokens.inc(endpoint, kind, amount=usage[f"{kind}_tokens"])
+    return TokenUsage(**usage)
+
+# Built once at startup from crisis_phrases.txt (or CRISIS_PHRASES_PATH).
+crisis_detector = create_crisis_detector()
+
+def is_crisis_message(message: str) -> bool:
+    return crisis_detector.matches(message)
+
+# Opt-in (REPLY_CACHE_ENABLED) cache of replies to stateless openers such as "hi".
+reply_cache = create_reply_cache()
+reply_cache_fingerprint = prompt_fingerprint(*(backend.spec.model for backend in model_router.backends), KELVIN.key, KELVIN.system_instruction)
+
+# De-duplicates chat submissions (double clicks, client retries). See idempotency_key.
+idempotency_store = create_idempotency_store()
+
+CallbackMetric(REGISTRY, "kelvin_upstream_in_flight", "Model calls currently running.", "gauge",
+               lambda: {(): upstream_limiter.in_flight})
+CallbackMetric(REGISTRY, "kelvin_upstream_waiting", "Requests waiting for an upstream slot, by priority (0 is interactive).", "gauge",
+               lambda: {(str(priority),): count for priority, count in upstream_limiter.waiting_by_priority().items()}, ["priority"])
+CallbackMetric(REGISTRY, "kelvin_upstream_oldest_wait_seconds", "How long the longest-waiting request has been queued.", "gauge",
+               lambda: {(): upstream_limiter.oldest_wait_seconds()})
+CallbackMetric(REGISTRY, "kelvin_upstream_estimated_wait_seconds", "Expected queueing time for a new chat request.", "gauge",
+               lambda: {(): upstream_limiter.estimated_wait(0)})
+CallbackMetric(REGISTRY, "kelvin_upstream_rejections_total", "Requests not admitted to an upstream slot, by reason.", "counter",
+               lambda: {(reason,): count for reason, count in upstream_limiter.rejected.items()}, ["reason"])
+CallbackMetric(REGISTRY, "kelvin_rate_limit_rejections_total", "Requests rejected by a rate limiter.", "counter",
+               lambda: {(limiter.name,): limiter.rejections for limiter in (chat_rate_limiter, session_rate_limiter)}, ["limiter"])
+CallbackMetric(REGISTRY, "kelvin_rate_limit_store_errors_total", "Rate limit checks that failed open because the store was unreachable.", "counter",
+               lambda: {(limiter.name,): limiter.store_errors for limiter in (chat_rate_limiter, session_rate_limiter)}, ["limiter"])
+CallbackMetric(REGISTRY, "kelvin_reply_cache_requests_total", "Reply cache lookups by result.", "counter",
+               lambda: {("hit",): reply_cache.hits, ("miss",): reply_cache.misses} if reply_cache else {}, ["result"])
+CallbackMetric(REGISTRY, "kelvin_idempotent_requests_total", "Duplicate chat submissions answered without a new model call, by how.", "counter",
+               lambda: {("replayed",): idempotency_store.replayed, ("joined",): idempotency_store.joined}, ["outcome"])
+CallbackMetric(REGISTRY, "kelvin_conversation_log_buffered", "Conversation turns waiting to be persisted.", "gauge",
+               lambda: {(): len(conversation_log)} if conversation_log is not None else {})
+CallbackMetric(REGISTRY, "kelvin_conversation_log_turns_total", "Conversation turns by outcome (written, dropped).", "counter",
+               lambda: {("written",): conversation_log.written, ("dropped",): conversation_log.dropped} if conversation_log is not None else {}, ["outcome"])
+CallbackMetric(REGISTRY, "kelvin_conversation_log_write_errors_total", "Failed conversation log batch writes.", "counter",
+               lambda: {(): conversation_log.write_errors} if conversation_log is not None else {})
+CallbackMetric(REGISTRY, "kelvin_log_records_dropped_total", "Log records dropped because the log queue was full.", "counter",
+               lambda: {(): dropped_log_records()})
+
+def per_model(value):
+    return lambda: {(backend.name,): value(backend) for backend in model_router.backends}
+
+CallbackMetric(REGISTRY, "kelvin_upstream_circuit_open", "1 while a model's circuit breaker is open or half-open.", "gauge",
+               per_model(lambda backend: 0 if backend.caller.breaker.state == "closed" else 1), ["model"])
+CallbackMetric(REGISTRY, "kelvin_upstream_circuit_opened_total", "Times a model's circuit breaker opened.", "counter",
+               per_model(lambda backend: backend.caller.breaker.times_opened), ["model"])
+CallbackMetric(REGISTRY, "kelvin_upstream_retries_total", "Upstream call retries.", "counter",
+               per_model(lambda backend: backend.caller.retries), ["model"])
+CallbackMetric(REGISTRY, "kelvin_upstream_hedges_total", "Hedged duplicate upstream calls.", "counter",
+               per_model(lambda backend: backend.caller.hedges), ["model"])
+CallbackMetric(REGISTRY, "kelvin_upstream_deadline_exceeded_total", "Upstream calls that ran out of time.", "counter",
+               per_model(lambda backend: backend.caller.deadline_exceeded), ["model"])
+CallbackMetric(REGISTRY, "kelvin_model_requests_total", "Routed model calls by model.", "counter",
+               per_model(lambda backend: backend.requests), ["model"])
+CallbackMetric(REGISTRY, "kelvin_model_failures_total", "Routed model calls that failed upstream, by model.", "counter",
+               per_model(lambda backend: backend.failures), ["model"])
+CallbackMetric(REGISTRY, "kelvin_model_fallbacks_total", "Calls that fell back from the preferred model.", "counter",
+               lambda: {(): model_router.fallbacks})
+
+def reply_cache_key(chat_request: ChatRequest, history: List[Dict]) -> Optional[str]:
+    if reply_cache is None or not reply_cache.applies_to(len(history)):
+        return None
+    return reply_cache.key(chat_request.message, reply_cache_fingerprint)
 
-    if not model:
-        return ChatResponse(reply="Sorry, the AI model is not configured correctly. Please check the server logs.")
+def upstream_busy_error(busy: UpstreamBusy) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="Kelvin is very busy right now. Please try again in a moment.",
+        headers={"Retry-After": retry_after_header(busy.retry_after)},
+    )
+
+# The summarizer's instructions are its system instruction (see prompts.SUMMARIZER).
+SUMMARY_PROMPT = """Current summary:
+{summary}
+
+New conversation turns:
+{turns}
+
+Updated summary:"""
+
+async def summarize_history(previous_summary: str, turns: List[Dict]) -> str:
+    transcript = "\n".join(f"{turn['role']}: {' '.join(turn['parts'])}" for turn in turns)
+    prompt = SUMMARY_PROMPT.format(summary=previous_summary or "(none yet)", turns=transcript)
+    # Summaries only shorten future prompts, so they queue behind chat turns.
+    async with upstream_limiter.slot(PRIORITY_BACKGROUND):
+        # Summaries are easy turns, so they go to the cheapest healthy model.
+        response = await model_router.call(0, lambda models: lambda: models.for_persona(SUMMARIZER).generate_content_async(prompt))
+    return response.text.strip()
+
+# History beyond HISTORY_TOKEN_BUDGET estimated tokens is folded into a rolling summary
+# (0 disables the window and forwards the full history).
+history_window = HistoryWindow(
+    token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "4000")),
+    summarizer=summarize_history,
+)
+
+async def resolve_history(request: Request, chat_request: ChatRequest) -> List[Dict]:
+    if chat_request.session_id is None:
+        history = strip_legacy_prefix([h.model_dump() for h in chat_request.chat_history])
+    else:
+        history = await session_store.get_history(chat_request.session_id)
+        if history is None:
+            raise HTTPException(status_code=404, detail="Unknown or expired session.")
+    return history_window.prepare(conversation_key(chat_request.session_id, request.headers.get("x-user-id"), history), history)
+
+async def record_turn(request: Request, chat_request: ChatRequest, reply: str, source: str = "model"):
+    turns = [{"role": "user", "parts": [chat_request.message]}, {"role": "model", "parts": [reply]}]
+    if chat_request.session_id is not None:
+        await session_store.append(chat_request.session_id, turns)
+    if conversation_log is not None:
+        conversation_log.add(conversation_turn(request, chat_request, reply, source, turns))
+
+def conversation_turn(request: Request, chat_request: ChatRequest, reply: str, source: str, turns: List[Dict]) -> ConversationTurn:
+    user_id = request.headers.get("x-user-id")
+    # Clients that re-send the transcript are grouped per user by their opening exchange (see
+    # conversation_key). Anonymous turns can't be attributed, so each is its own conversation.
+    opening = strip_legacy_prefix([h.model_dump() for h in chat_request.chat_history[:2]]) or turns
+    conversation_id = conversation_key(chat_request.session_id, user_id, opening)
+    idempotency_header = request.headers.get("idempotency-key", "").strip()
+    if conversation_id is not None and idempotency_header:
+        # Retries of a submission carry the same key, so they overwrite the same turn.
+        turn_id = stable_id(conversation_id, "idempotency-key", idempotency_header)
+    else:
+        # Server-generated: X-Request-ID is client-controlled and could overwrite other turns.
+        turn_id = uuid.uuid4().hex
+    return ConversationTurn(
+        id=turn_id,
+        conversation_id=conversation_id or f"anonymous-{turn_id}",
+        user_id=user_id,
+        message=chat_request.message,
+        reply=reply,
+        source=source,
+        created_at=timestamp(),
+    )
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+@app.post("/api/session", response_model=SessionResponse)
+async def create_session(request: Request, session_request: Optional[SessionCreateRequest] = None):
+    await enforce_rate_limit(session_rate_limiter, request)
+    history = strip_legacy_prefix([h.model_dump() for h in session_request.chat_history]) if session_request else []
+    return SessionResponse(session_id=await session_store.create(history))
+
+@app.delete("/api/session/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    await session_store.delete(session_id)
+
+def idempotency_key(request: Request, chat_request: ChatRequest, endpoint: str) -> Optional[Tuple[str, bool, str]]:
+    """Returns the de-duplication key for a chat request, whether its result is remembered, and
+    the fingerprint of the request's content.
+
+    With an Idempotency-Key header, duplicates share one model call and retries within
+    IDEMPOTENCY_TTL_SECONDS get the same reply. The key is scoped to the user, the session or,
+    failing both, the client IP, and a reuse with a different message or history is a 422.
+    Without the header, session requests are keyed on the session and message, but only while
+    in flight: the same message sent again later is a new turn.
+    """
+    header = request.headers.get("idempotency-key", "").strip()
+    if header:
+        if len(header) > 255:
+            raise HTTPException(status_code=400, detail="Idempotency-Key must be at most 255 characters.")
+        user_id = request.headers.get("x-user-id", "")
+        if not user_id and chat_request.session_id is None:
+            user_id = f"ip:{request.client.host if request.client else 'unknown'}"
+        fingerprint = stable_id(chat_request.message, dumps([h.model_dump() for h in chat_request.chat_history]))
+        return stable_id(endpoint, user_id, chat_request.session_id or "", header), True, fingerprint
+    if chat_request.session_id is not None:
+        return stable_id(endpoint, chat_request.session_id, chat_request.message), False, ""
+    return None
+
+def idempotency_mismatch_error() -> HTTPException:
+    return HTTPException(status_code=422, detail="This Idempotency-Key was already used for a different message.")
+
+async def crisis_turn(request: Request, chat_request: ChatRequest, timings: RequestTimings) -> bool:
+    """Checks for a crisis message and records its turn. Runs before the idempotency lookup, so a
+    crisis message always gets the crisis reply, whatever key it was sent with."""
+    with timings.stage("crisis_check"):
+        crisis = is_crisis_message(chat_request.message)
+    if crisis:
+        await record_turn(request, chat_request, CRISIS_REPLY, "crisis")
+    return crisis
+
+# Fallback replies are not remembered, so a retry gets a real attempt. /api/chat marks them
+# with an X-Fallback-Reply header, so clients (and the load generator) can tell them apart
+# from model replies without comparing text.
+FALLBACK_REPLIES = frozenset({MODEL_NOT_CONFIGURED_REPLY, UPSTREAM_ERROR_REPLY, UPSTREAM_UNAVAILABLE_REPLY})
+
+async def chat_reply(request: Request, chat_request: ChatRequest, timings: RequestTimings) -> ChatResponse:
+    # Crisis replies (see crisis_turn) are never rate limited.
+    with timings.stage("rate_limit"):
+        await enforce_rate_limit(chat_rate_limiter, request, chat_request.session_id)
+
+    if not await model_router.configured():
+        return ChatResponse(reply=MODEL_NOT_CONFIGURED_REPLY)
+
+    with timings.stage("history"):
+        history = await resolve_history(request, chat_request)
+    cache_key = reply_cache_key(chat_request, history)
+    if cache_key:
+        cached_reply = reply_cache.get(cache_key)
+        if cached_reply:
+            await record_turn(request, chat_request, cached_reply, "cache")
+            return ChatResponse(reply=cached_reply)
 
     try:
-        history = [h.dict() for h in chat_request.chat_history]
-        print(f"Request body: {chat_request.dict()}")
-        print(f"History being sent to Gemini: {history}")
+        logger.debug(
+            "Sending chat turn to Gemini",
+            extra={"message_text": redact(chat_request.message), "history_turns": len(history), "session_id": chat_request.session_id},
+        )
 
-        chat_session = model.start_chat(history=history)
-        response = chat_session.send_message(f"{system_instruction} The user just said: {chat_request.message}")
+        message = chat_request.message
+        async with AsyncExitStack() as slot:
+            with timings.stage("upstream_wait"):
+                await slot.enter_async_context(upstream_limiter.slot())
+            with timings.stage("send_message"):
+                response = await model_router.call(conversation_tokens(history, message), send_chat_message(history, message))
 
-        return ChatResponse(reply=response.text)
+        if cache_key:
+            reply_cache.add(cache_key, response.text)
+        await record_turn(request, chat_request, response.text)
+        return ChatResponse(reply=response.text, usage=record_usage("chat", response))
+    except UpstreamBusy as e:
+        raise upstream_busy_error(e)
+    except CircuitOpen:
+        upstream_errors.inc("chat", "CircuitOpen")
+        return ChatResponse(reply=UPSTREAM_UNAVAILABLE_REPLY)
     except Exception as e:
-        print(f"Error during Gemini API call: {e}")
-        return ChatResponse(reply="Sorry, I had trouble connecting to the AI model.")
\ No newline at end of file
+        upstream_errors.inc("chat", type(e).__name__)
+        logger.warning("Error during Gemini API call: %s", e)
+        return ChatResponse(reply=UPSTREAM_ERROR_REPLY)
+
+@app.post("/api/chat", response_model=ChatResponse)
+async def post_chat(request: Request, chat_request: ChatRequest, http_response: Response):
+    timings = RequestTimings(request, "chat")
+    # Checked before the rate limit, so duplicates of a request don't use up its tokens.
+    key = idempotency_key(request, chat_request, "chat")
+    if await crisis_turn(request, chat_request, timings):
+        response = ChatResponse(reply=CRISIS_REPLY)
+    elif key is None:
+        response = await chat_reply(request, chat_request, timings)
+    else:
+        key, remembered, fingerprint = key
+        try:
+            response = await idempotency_store.run(
+                key,
+                lambda: chat_reply(request, chat_request, timings),
+                remember=lambda response: remembered and response.reply not in FALLBACK_REPLIES,
+                fingerprint=fingerprint,
+            )
+        except IdempotencyMismatch:
+            raise idempotency_mismatch_error()
+    if response.reply in FALLBACK_REPLIES:
+        http_response.headers["X-Fallback-Reply"] = "1"
+    timings.handler_done()
+    return response
+
+async def release_stream(slot: AsyncExitStack, settle: Callable[[Optional[dict]], None]):
+    settle(None)
+    await slot.aclose()
+
+def done_event_response(done: dict) -> StreamingResponse:
+    return StreamingResponse(iter([sse_event("done", done)]), media_type="text/event-stream")
+
+# Server-Sent Events variant of /api/chat. Emits one `chunk` event per partial reply
+# received from Gemini, then a single `done` event carrying the complete reply. Crisis
+# and error fallbacks are delivered as a `done` event only, with the same text as /api/chat.
+@app.post("/api/chat/stream")
+async def post_chat_stream(request: Request, chat_request: ChatRequest):
+    timings = RequestTimings(request, "chat_stream")
+    key = idempotency_key(request, chat_request, "chat_stream")
+    if await crisis_turn(request, chat_request, timings):
+        return done_event_response({"reply": CRISIS_REPLY})
+    if key is None:
+        return await chat_stream(request, chat_request, timings, lambda done: None)
+    # Duplicates wait for the first request's `done` event and get it on its own.
+    key, remembered, fingerprint = key
+    try:
+        found, done = await idempotency_store.join(key, fingerprint)
+    except IdempotencyMismatch:
+        raise idempotency_mismatch_error()
+    if found:
+        return done_event_response(done)
+
+    def settle(done: Optional[dict]):
+        # None: the stream ended without a reply (e.g. the client disconnected).
+        if done is None:
+            idempotency_store.fail(key, Abandoned())
+        else:
+            idempotency_store.finish(key, done, remembered and done["reply"] not in FALLBACK_REPLIES)
+
+    try:
+        return await chat_stream(request, chat_request, timings, settle)
+    except BaseException as e:
+        idempotency_store.fail(key, e)
+        raise
+
+async def chat_stream(request: Request, chat_request: ChatRequest, timings: RequestTimings,
+                      settle: Callable[[Optional[dict]], None]) -> StreamingResponse:
+    def done_response(done: dict) -> StreamingResponse:
+        settle(done)
+        return done_event_response(done)
+
+    with timings.stage("rate_limit"):
+        await enforce_rate_limit(chat_rate_limiter, request, chat_request.session_id)
+
+    if not await model_router.configured():
+        return done_response({"reply": MODEL_NOT_CONFIGURED_REPLY})
+
+    with timings.stage("history"):
+        history = await resolve_history(request, chat_request)
+    cache_key = reply_cache_key(chat_request, history)
+    if cache_key:
+        cached_reply = reply_cache.get(cache_key)
+        if cached_reply:
+            await record_turn(request, chat_request, cached_reply, "cache")
+            return done_response({"reply": cached_reply})
+
+    # Claim the upstream slot before the response starts so overload is still a 503.
+    slot = AsyncExitStack()
+    try:
+        with timings.stage("upstream_wait"):
+            await slot.enter_async_context(upstream_limiter.slot())
+    except UpstreamBusy as e:
+        raise upstream_busy_error(e)
+
+    # Stages below run after the response has started, so they reach the histograms
+    # but not the Server-Timing header.
+    async def event_stream():
+        done = None
+        try:
+            with timings.stage("send_message"):
+                # Retries, hedging and fallback cover the call up to the first chunk; a stream
+                # that fails or stalls midway falls back to the error reply below.
+                message = chat_request.message
+                deadline = model_router.deadline()
+                backend, response = await model_router.call_with_backend(
+                    conversation_tokens(history, message), send_chat_message(history, message, stream=True), deadline, stream=True
+                )
+                reply_parts = []
+                # The same deadline bounds the rest of the stream, so a stalled upstream can't
+                # hold the slot and the connection indefinitely.
+                async for chunk in model_router.stream(backend, response, deadline):
+                    if chunk.text:
+                        reply_parts.append(chunk.text)
+                        yield sse_event("chunk", {"text": chunk.text})
+            reply = "".join(reply_parts)
+            if cache_key:
+                reply_cache.add(cache_key, reply)
+            await record_turn(request, chat_request, reply)
+            usage = record_usage("chat_stream", response)
+            done = {"reply": reply, "usage": usage.model_dump() if usage else None}
+        except CircuitOpen:
+            upstream_errors.inc("chat_stream", "CircuitOpen")
+            done = {"reply": UPSTREAM_UNAVAILABLE_REPLY}
+        except Exception as e:
+            upstream_errors.inc("chat_stream", type(e).__name__)
+            logger.warning("Error during Gemini API call: %s", e)
+            done = {"reply": UPSTREAM_ERROR_REPLY}
+        finally:
+            # `done` is still None if the client went away mid-stream.
+            settle(done)
+            await slot.aclose()
+        yield sse_event("done", done)
+
+    timings.handler_done()
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Releases the slot and the idempotency key if the client disconnects before the
+        # stream is consumed.
+        background=BackgroundTask(release_stream, slot, settle),
+    )
+
+# Journal. Entries are scoped to the X-User-Id header until the app has real accounts.
+def journal_user(request: Request) -> str:
+    user_id = request.headers.get("x-user-id", "").strip()
+    if not user_id or len(user_id) > 128:
+        raise HTTPException(status_code=400, detail="An X-User-Id header is required.")
+    return user_id
+
+def journal_entry_response(entry) -> JournalEntryResponse:
+    return JournalEntryResponse(**entry._asdict())
+
+@app.post("/api/journal/entries", response_model=JournalEntryResponse, status_code=201)
+async def append_journal_entry(request: Request, entry: JournalEntryCreate):
+    created = await journal_store.append(
+        journal_user(request), entry.id, entry.title, entry.mood, entry.text,
+        timestamp(entry.created_at) if entry.created_at else None,
+    )
+    return journal_entry_response(created)
+
+@app.patch("/api/journal/entries/{entry_id}", response_model=JournalEntryResponse)
+async def edit_journal_entry(request: Request, entry_id: str, edit: JournalEntryUpdate):
+    changes = edit.model_dump(exclude={"base_version"}, exclude_none=True)
+    try:
+        updated = await journal_store.update(journal_user(request), entry_id, changes, edit.base_version)
+    except JournalConflict as e:
+        return JSONResponse({"detail": "The entry was changed elsewhere.", "current": e.current._asdict()}, status_code=409)
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Unknown journal entry.")
+    return journal_entry_response(updated)
+
+# Newest first. Pass next_cursor back as `cursor` for the following page.
+@app.get("/api/journal/entries", response_model=JournalPageResponse)
+async def list_journal_entries(request: Request, limit: int = Query(20, ge=1, le=100), cursor: Optional[str] = None):
+    try:
+        entries, next_cursor = await journal_store.page(journal_user(request), limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JournalPageResponse(entries=[journal_entry_response(entry) for entry in entries], next_cursor=next_cursor)
+
+# Delta sync: entries written after the client's `since` version, oldest first. Keep calling
+# with the returned version while has_more is true; an unchanged journal costs one small query.
+# A `since` from another epoch (the store was emptied, e.g. an in-memory store restarted) is
+# not comparable with current versions, so the sync starts again from 0.
+@app.get("/api/journal/changes", response_model=JournalChangesResponse)
+async def journal_changes(request: Request, since: int = Query(0, ge=0), limit: int = Query(200, ge=1, le=500),
+                          epoch: Optional[str] = Query(None, max_length=64)):
+    if epoch is not None and epoch != journal_store.epoch:
+        since = 0
+    changes = await journal_store.changes(journal_user(request), since, limit)
+    return JournalChangesResponse(
+        entries=[journal_entry_response(entry) for entry in changes.entries],
+        version=changes.version,
+        epoch=journal_store.epoch,
+        has_more=changes.has_more,
+    )
@@ -0,0 +1,215 @@
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; covers sub-millisecond CPU stages up to slow upstream calls.
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, registry: "Registry", name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        registry.register(self)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self._values.items()
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class CallbackMetric(_Metric):
+    """Counter or gauge whose samples are read from elsewhere (e.g. a cache's hit count) at scrape time."""
+
+    def __init__(self, registry, name, help_text, kind: str, callback: Callable[[], Dict[LabelValues, float]], labelnames=()):
+        super().__init__(registry, name, help_text, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in self.callback().items()
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series: Dict[LabelValues, list] = {}
+
+    def observe(self, *labels: str, value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                le_label = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total!r}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests_in_flight = Gauge(REGISTRY, "kelvin_http_requests_in_flight", "HTTP requests currently being served.", ["path"])
+http_request_seconds = Histogram(REGISTRY, "kelvin_http_request_seconds", "Time from request start to the first response byte.", ["method", "path", "status"])
+stage_seconds = Histogram(REGISTRY, "kelvin_stage_seconds", "Time spent in each stage of a request handler.", ["endpoint", "stage"])
+upstream_errors = Counter(REGISTRY, "kelvin_upstream_errors_total", "Failed model calls by exception type.", ["endpoint", "error"])
+model_tokens = Counter(REGISTRY, "kelvin_model_tokens_total", "Tokens reported by the model, by kind (prompt, reply, cached).", ["endpoint", "kind"])
+
+SERVER_TIMING_ENABLED = os.getenv("METRICS_SERVER_TIMING", "false").lower() in ("1", "true", "yes")
+
+
+class RequestTimings:
+    """Times the stages of one request into ``kelvin_stage_seconds``.
+
+    The first stage, ``parse_validate``, runs from when MetricsMiddleware saw the request to
+    when the handler started, i.e. routing, reading the body and Pydantic validation.
+    Stage durations are also kept on ``request.state`` for the Server-Timing header.
+    """
+
+    def __init__(self, request, endpoint: str):
+        self.endpoint = endpoint
+        self.state = request.state
+        self.stages: Dict[str, float] = {}
+        self.state.stage_timings = self.stages
+        self.state.stage_endpoint = endpoint
+        started = getattr(self.state, "request_start", None)
+        if started is not None:
+            self._record("parse_validate", time.perf_counter() - started)
+
+    @contextmanager
+    def stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._record(name, time.perf_counter() - started)
+
+    def handler_done(self):
+        """Call right before returning; the time until the response starts is recorded as ``serialize``."""
+        self.state.handler_end = time.perf_counter()
+
+    def _record(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0) + seconds
+        stage_seconds.observe(self.endpoint, name, value=seconds)
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording in-flight requests, request latency and the ``serialize`` stage.
+
+    In-flight requests are labelled with their path only for ``tracked_paths``, to keep the
+    label set bounded; everything else is counted as ``other``.
+    """
+
+    def __init__(self, app, tracked_paths: Sequence[str] = ()):
+        self.app = app
+        self.tracked_paths = frozenset(tracked_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        state = scope.setdefault("state", {})
+        state["request_start"] = started
+        path = scope["path"] if scope["path"] in self.tracked_paths else "other"
+        http_requests_in_flight.inc(path)
+
+        async def send_with_metrics(message):
+            if message["type"] == "http.response.start":
+                now = time.perf_counter()
+                route = scope.get("route")
+                http_request_seconds.observe(scope["method"], getattr(route, "path", "unmatched"), str(message["status"]), value=now - started)
+
+                timings = state.get("stage_timings")
+                handler_end = state.get("handler_end")
+                if timings is not None and handler_end is not None:
+                    serialize = now - handler_end
+                    timings["serialize"] = serialize
+                    stage_seconds.observe(state["stage_endpoint"], "serialize", value=serialize)
+                if SERVER_TIMING_ENABLED and timings:
+                    server_timing = ", ".join(f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items())
+                    message.setdefault("headers", []).append((b"server-timing", server_timing.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            http_requests_in_flight.dec(path)
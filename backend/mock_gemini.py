@@ -0,0 +1,105 @@
+import asyncio
+import math
+import os
+import random
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+from history_window import estimate_tokens
+
+MOCK_REPLIES = [
+    "That sounds like a lot to carry. I'm here with you, and I'm glad you shared it.",
+    "It makes sense that you'd feel that way. What part of it feels heaviest right now?",
+    "Thank you for telling me. Taking a slow breath together might help for a moment.",
+    "You're doing your best in a hard situation, and that matters. Would you like to talk more about it?",
+    "I hear you. It's okay to not have everything figured out today.",
+]
+
+
+class MockResponse:
+    def __init__(self, text: str, chunks: List[str], chunk_interval: float, usage_metadata=None):
+        self.text = text
+        self._chunks = chunks
+        self._chunk_interval = chunk_interval
+        self.usage_metadata = usage_metadata
+
+    def __aiter__(self):
+        return self._stream()
+
+    async def _stream(self):
+        for index, chunk in enumerate(self._chunks):
+            if index:
+                await asyncio.sleep(self._chunk_interval)
+            yield MockResponse(chunk, [chunk], 0)
+
+
+class MockChatSession:
+    def __init__(self, model: "MockGenerativeModel", history: Optional[List[Dict]]):
+        self.model = model
+        self.history = list(history or [])
+
+    async def send_message_async(self, content, stream: bool = False, **kwargs):
+        return await self.model.generate_content_async(self.history + [{"role": "user", "parts": [content]}], stream=stream)
+
+
+class MockGenerativeModel:
+    """Stand-in for ``genai.GenerativeModel`` used for load tests, with no network calls.
+
+    Time to first token is log-normally distributed around ``latency_ms``; replies are split
+    into ``chunk_chars``-sized chunks ``chunk_interval_ms`` apart, and ``error_rate`` of calls
+    fail with ServiceUnavailable as the real upstream does under load.
+    """
+
+    def __init__(self, model_name: str = "mock", latency_ms: float = 800, latency_sigma: float = 0.4,
+                 error_rate: float = 0.0, chunk_chars: int = 24, chunk_interval_ms: float = 40,
+                 system_instruction: Optional[str] = None):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.chunk_chars = chunk_chars
+        self.chunk_interval_ms = chunk_interval_ms
+        self.system_instruction = system_instruction
+
+    def start_chat(self, history: Optional[List[Dict]] = None) -> MockChatSession:
+        return MockChatSession(self, history)
+
+    async def generate_content_async(self, contents, stream: bool = False, **kwargs) -> MockResponse:
+        if self.latency_ms > 0:
+            await asyncio.sleep(random.lognormvariate(math.log(self.latency_ms), self.latency_sigma) / 1000)
+        if random.random() < self.error_rate:
+            raise google_exceptions.ServiceUnavailable("Mock upstream error")
+
+        text = random.choice(MOCK_REPLIES)
+        prompt_tokens = estimate_tokens(self.system_instruction or "") + estimate_tokens(_contents_text(contents))
+        reply_tokens = estimate_tokens(text)
+        usage = SimpleNamespace(prompt_token_count=prompt_tokens, candidates_token_count=reply_tokens,
+                                cached_content_token_count=0, total_token_count=prompt_tokens + reply_tokens)
+        chunks = [text[i:i + self.chunk_chars] for i in range(0, len(text), self.chunk_chars)]
+        chunk_interval = self.chunk_interval_ms / 1000
+        if not stream:
+            # A non-streaming call still pays for generating every chunk.
+            await asyncio.sleep(chunk_interval * (len(chunks) - 1))
+        return MockResponse(text, chunks, chunk_interval, usage)
+
+
+def _contents_text(contents) -> str:
+    if isinstance(contents, str):
+        return contents
+    return " ".join(" ".join(turn["parts"]) for turn in contents)
+
+
+
+def create_mock_model(model_name: str, system_instruction: Optional[str] = None, **overrides) -> MockGenerativeModel:
+    """Configured from the MOCK_* variables; ``overrides`` (e.g. from a model registry entry) win."""
+    options = dict(
+        latency_ms=float(os.getenv("MOCK_LATENCY_MS", "800")),
+        latency_sigma=float(os.getenv("MOCK_LATENCY_SIGMA", "0.4")),
+        error_rate=float(os.getenv("MOCK_ERROR_RATE", "0")),
+        chunk_chars=int(os.getenv("MOCK_CHUNK_CHARS", "24")),
+        chunk_interval_ms=float(os.getenv("MOCK_CHUNK_INTERVAL_MS", "40")),
+    )
+    options.update(overrides)
+    return MockGenerativeModel(model_name=model_name, system_instruction=system_instruction, **options)
@@ -0,0 +1,49 @@
+import asyncio
+import logging
+import time
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ModelClient:
+    """Builds the model in a background thread after the server has started.
+
+    Importing and configuring the Gemini SDK takes about a second, so doing it at import time
+    delays the first response after a cold start. ``get()`` lets a request that arrives while
+    initialisation is still running wait for it rather than fail.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        self.factory = factory
+        self.model: Optional[Any] = None
+        self.state = "pending"
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._initialise())
+
+    async def _initialise(self):
+        self.state = "initialising"
+        started = time.perf_counter()
+        try:
+            self.model = await asyncio.to_thread(self.factory)
+            self.state = "ready"
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e)
+            logger.critical("Error configuring Gemini API: %s", e)
+        self.init_seconds = time.perf_counter() - started
+
+    async def get(self) -> Optional[Any]:
+        """Returns the model, waiting for initialisation if it is still running; None if it failed."""
+        if self._task is not None and not self._task.done():
+            await asyncio.shield(self._task)
+        return self.model
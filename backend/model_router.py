@@ -0,0 +1,236 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from model_client import ModelClient
+from resilience import CircuitOpen, DeadlineExceeded, ResilientCaller, create_resilient_caller, is_refusal
+
+logger = logging.getLogger(__name__)
+
+
+class ModelSpec(NamedTuple):
+    """One entry of the model registry."""
+    name: str
+    backend: str = "gemini"  # "gemini" or "mock"
+    model: str = "gemini-flash-latest"
+    cost_per_1k_tokens: float = 0.0
+    latency_target_ms: float = 5000
+    context_tokens: int = 1_000_000
+    max_concurrent: int = 64
+    # Extra keyword arguments for the backend, e.g. MOCK_* overrides for a mock entry.
+    options: Dict[str, Any] = {}
+
+
+def load_model_specs(raw: str) -> List[ModelSpec]:
+    """Parses a JSON list of registry entries; unknown keys are rejected so typos fail at startup."""
+    entries = json.loads(raw)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("The model registry must be a non-empty JSON list.")
+    specs = [ModelSpec(**entry) for entry in entries]
+    names = [spec.name for spec in specs]
+    if len(set(names)) != len(names):
+        raise ValueError("Model registry names must be unique.")
+    return specs
+
+
+class ModelBackend:
+    """A registry entry at runtime: its model, its own resilient caller and recent outcomes."""
+
+    def __init__(self, spec: ModelSpec, client: ModelClient, caller: ResilientCaller, outcome_window: int = 100):
+        self.spec = spec
+        self.client = client
+        self.caller = caller
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self._outcomes = deque(maxlen=outcome_window)
+
+    @property
+    def name(self) -> str:
+        return self.spec.name
+
+    @property
+    def load(self) -> float:
+        return self.in_flight / self.spec.max_concurrent
+
+    def error_rate(self, min_samples: int = 10) -> float:
+        if len(self._outcomes) < min_samples:
+            return 0.0
+        return 1 - sum(self._outcomes) / len(self._outcomes)
+
+    def p95_ms(self, min_samples: int = 20) -> Optional[float]:
+        """p95 of complete (non-streamed) replies."""
+        if len(self.caller.latency) < min_samples:
+            return None
+        return self.caller.latency.percentile(0.95) * 1000
+
+    def record(self, ok: bool):
+        self.requests += 1
+        if not ok:
+            self.failures += 1
+        self._outcomes.append(ok)
+
+
+class ModelRouter:
+    """Picks a model backend per request and falls back to the next one when a call fails.
+
+    Healthy backends are preferred over degraded ones. A backend is degraded while its circuit
+    breaker is not closed, its recent error rate is above ``max_error_rate``, its observed p95
+    is over its latency target, or it is at ``max_concurrent``. Among healthy backends, short
+    conversations (``easy_turn_tokens`` or fewer) go to the cheapest one; longer ones follow
+    registry order, so the first entry is the primary. Backends whose context is too small for
+    the conversation are skipped. One deadline covers the whole request, fallbacks included.
+    """
+
+    def __init__(self, backends: List[ModelBackend], easy_turn_tokens: int = 500, max_error_rate: float = 0.2):
+        self.backends = backends
+        self.easy_turn_tokens = easy_turn_tokens
+        self.max_error_rate = max_error_rate
+        self.fallbacks = 0
+
+    @property
+    def deadline_seconds(self) -> float:
+        return self.primary.caller.deadline_seconds
+
+    def deadline(self) -> float:
+        """A request deadline (``time.monotonic()`` value) starting now."""
+        return time.monotonic() + self.deadline_seconds
+
+    @property
+    def primary(self) -> ModelBackend:
+        return self.backends[0]
+
+    @property
+    def ready(self) -> bool:
+        return any(backend.client.ready for backend in self.backends)
+
+    def start(self):
+        for backend in self.backends:
+            backend.client.start()
+
+    async def configured(self) -> bool:
+        """Waits for initialisation to finish; True if at least one backend has a model."""
+        for backend in self.backends:
+            await backend.client.get()
+        return any(backend.client.model is not None for backend in self.backends)
+
+    def degraded(self, backend: ModelBackend) -> bool:
+        p95 = backend.p95_ms()
+        return (
+            backend.caller.breaker.state != "closed"
+            or backend.error_rate() > self.max_error_rate
+            or (p95 is not None and p95 > backend.spec.latency_target_ms)
+            or backend.load >= 1
+        )
+
+    def candidates(self, conversation_tokens: int) -> List[ModelBackend]:
+        """Backends to try for a conversation of this size, best first."""
+        fitting = [backend for backend in self.backends if backend.spec.context_tokens >= conversation_tokens]
+        if not fitting:
+            # Nothing is big enough; the largest context truncates the least.
+            fitting = [max(self.backends, key=lambda backend: backend.spec.context_tokens)]
+        easy = conversation_tokens <= self.easy_turn_tokens
+        order = {backend.name: index for index, backend in enumerate(self.backends)}
+
+        def preference(backend: ModelBackend):
+            if self.degraded(backend):
+                return (1, backend.error_rate(), backend.load, order[backend.name])
+            return (0, backend.spec.cost_per_1k_tokens if easy else 0, order[backend.name])
+
+        return sorted(fitting, key=preference)
+
+    async def call(self, conversation_tokens: int, make_call: Callable[[Any], Callable[[], Awaitable[Any]]],
+                   deadline: Optional[float] = None) -> Any:
+        _, result = await self.call_with_backend(conversation_tokens, make_call, deadline)
+        return result
+
+    async def call_with_backend(self, conversation_tokens: int, make_call: Callable[[Any], Callable[[], Awaitable[Any]]],
+                                deadline: Optional[float] = None, stream: bool = False) -> Tuple[ModelBackend, Any]:
+        """Runs ``make_call(model)`` on the best backend, falling back on upstream failures.
+
+        Fallbacks only get the time left before ``deadline`` (default: ``deadline_seconds``
+        from now). Errors that are not the upstream's fault (e.g. a blocked prompt) are raised
+        straight away. If every backend fails, the last error is raised (CircuitOpen if all were
+        open, DeadlineExceeded if time ran out before a fallback). ``stream`` marks a call that
+        returns a stream, to be read with ``stream()``.
+        """
+        deadline = self.deadline() if deadline is None else deadline
+        error: Optional[BaseException] = None
+        for attempt, backend in enumerate(self.candidates(conversation_tokens)):
+            if time.monotonic() >= deadline:
+                error = DeadlineExceeded(f"Upstream call exceeded {self.deadline_seconds:.1f}s")
+                break
+            model = await backend.client.get()
+            if model is None:
+                continue
+            if attempt:
+                self.fallbacks += 1
+                logger.info("Falling back to model backend %s.", backend.name)
+            backend.in_flight += 1
+            try:
+                result = await backend.caller.call(make_call(model), deadline, stream)
+            except CircuitOpen as e:
+                error = e
+                continue
+            except Exception as e:
+                # A refusal (bad request, blocked prompt) would be refused by any backend.
+                if is_refusal(e):
+                    backend.record(ok=True)
+                    raise
+                backend.record(ok=False)
+                error = e
+                continue
+            finally:
+                backend.in_flight -= 1
+            backend.record(ok=True)
+            return backend, result
+        raise error or CircuitOpen()
+
+    async def stream(self, backend: ModelBackend, response: Any, deadline: float) -> AsyncIterator[Any]:
+        """Yields the chunks of a streamed ``response`` from ``backend`` until ``deadline``.
+
+        ``call`` only covers a stream up to its first chunk. An upstream that stalls after that
+        raises DeadlineExceeded here and counts as a failure of the backend.
+        """
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=max(0, deadline - time.monotonic()))
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                backend.caller.deadline_exceeded += 1
+                backend.caller.breaker.record_failure()
+                raise DeadlineExceeded(f"Upstream stream exceeded {self.deadline_seconds:.1f}s")
+            yield chunk
+
+
+def create_model_router(model_factory: Callable[[ModelSpec], Any], default_spec: ModelSpec) -> ModelRouter:
+    """Builds the router from MODEL_REGISTRY_PATH (a JSON file) or MODEL_REGISTRY (inline JSON).
+
+    Without either, the registry is just ``default_spec``. Every backend gets its own circuit
+    breaker and latency statistics, configured by the UPSTREAM_* and BREAKER_* variables.
+    """
+    registry_path = os.getenv("MODEL_REGISTRY_PATH")
+    if registry_path:
+        with open(registry_path, encoding="utf-8") as registry_file:
+            specs = load_model_specs(registry_file.read())
+    elif os.getenv("MODEL_REGISTRY"):
+        specs = load_model_specs(os.environ["MODEL_REGISTRY"])
+    else:
+        specs = [default_spec]
+
+    backends = [
+        ModelBackend(spec, ModelClient(lambda spec=spec: model_factory(spec)), create_resilient_caller())
+        for spec in specs
+    ]
+    logger.info("Model registry: %s", ", ".join(f"{spec.name} ({spec.backend}:{spec.model})" for spec in specs))
+    return ModelRouter(
+        backends,
+        easy_turn_tokens=int(os.getenv("ROUTER_EASY_TURN_TOKENS", "500")),
+        max_error_rate=float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.2")),
+    )
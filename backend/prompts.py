@@ -0,0 +1,69 @@
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+
+class Persona(NamedTuple):
+    """A system instruction under a name and version; bump the version whenever the text changes."""
+    name: str
+    version: str
+    system_instruction: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}@{self.version}"
+
+
+KELVIN = Persona(
+    "kelvin", "2",
+    "You are Kelvin, a supportive and empathetic companion. Your goal is to be a good listener and provide a safe space for users to reflect. Keep your responses concise (2-3 sentences). Do not give unsolicited advice. Your tone should be warm, encouraging, and gentle.",
+)
+
+SUMMARIZER = Persona(
+    "summarizer", "1",
+    "You update the running summary of a supportive conversation between a user and Kelvin, a caring companion. Keep the facts, feelings and concerns the user shared, in at most 150 words, written in the third person. Reply with the updated summary only.",
+)
+
+# Before version 2 the instruction was pasted in front of every user message, and clients that
+# echo the transcript back still send turns carrying it.
+LEGACY_USER_PREFIX = f"{KELVIN.system_instruction} The user just said: "
+
+
+def strip_legacy_prefix(history: List[Dict]) -> List[Dict]:
+    """Removes the pre-version-2 instruction prefix from user turns, leaving other turns as they are."""
+    cleaned = []
+    for turn in history:
+        if turn["role"] == "user" and any(part.startswith(LEGACY_USER_PREFIX) for part in turn["parts"]):
+            turn = {"role": "user", "parts": [part[len(LEGACY_USER_PREFIX):] if part.startswith(LEGACY_USER_PREFIX) else part for part in turn["parts"]]}
+        cleaned.append(turn)
+    return cleaned
+
+
+class PersonaModels:
+    """Model instances for one backend, configured with a persona's system instruction.
+
+    The instruction is attached to the model rather than to each message, so it is sent once per
+    call as a stable prefix (ahead of the history) that provider-side context caching can reuse.
+    Instances are built on first use and then shared by every request for that persona.
+    """
+
+    def __init__(self, build: Callable[[str], Any]):
+        self._build = build
+        self._models: Dict[str, Any] = {}
+
+    def for_persona(self, persona: Persona) -> Any:
+        model = self._models.get(persona.key)
+        if model is None:
+            model = self._models[persona.key] = self._build(persona.system_instruction)
+        return model
+
+
+def token_usage(response: Any) -> Optional[Dict[str, int]]:
+    """Token counts from a response's ``usage_metadata``, or None if the backend didn't report them."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return None
+    return {
+        "prompt_tokens": usage.prompt_token_count,
+        "reply_tokens": usage.candidates_token_count,
+        "cached_tokens": getattr(usage, "cached_content_token_count", 0) or 0,
+        "total_tokens": usage.total_token_count,
+    }
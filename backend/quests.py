@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import logging
+import os
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUESTS_PATH = os.path.join(os.path.dirname(__file__), "quests.txt")
+
+
+class Quest(NamedTuple):
+    id: str
+    text: str
+
+
+def quest_id(text: str) -> str:
+    # Content-derived, so ids agree across workers and restarts (unlike the builtin hash()).
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def load_quests(path: str = DEFAULT_QUESTS_PATH) -> List[Quest]:
+    with open(path, encoding="utf-8") as quests_file:
+        texts = [line.strip() for line in quests_file if line.strip() and not line.startswith("#")]
+    return [Quest(id=quest_id(text), text=text) for text in texts]
+
+
+class QuestCatalogue:
+    """Immutable list of quests with deterministic per-day selection."""
+
+    def __init__(self, quests: List[Quest]):
+        if not quests:
+            raise ValueError("The quest catalogue is empty.")
+        self.quests = sorted(quests, key=lambda quest: quest.id)
+
+    def __len__(self) -> int:
+        return len(self.quests)
+
+    def for_day(self, day: date, user_id: Optional[str] = None) -> Quest:
+        """Same quest for everyone (or for one user, if given) for the whole UTC day."""
+        seed = hashlib.sha256(f"{day.isoformat()}:{user_id or ''}".encode("utf-8")).digest()
+        return self.quests[int.from_bytes(seed[:8], "big") % len(self.quests)]
+
+
+def next_utc_midnight(now: datetime) -> datetime:
+    return datetime.combine(now.date() + timedelta(days=1), datetime.min.time(), tzinfo=timezone.utc)
+
+
+class QuestSource(ABC):
+    @abstractmethod
+    async def fetch(self) -> List[Quest]:
+        ...
+
+
+class InMemoryQuestSource(QuestSource):
+    """Fixed quest list; stands in for Firestore in tests and local runs."""
+
+    def __init__(self, quests: List[Quest]):
+        self.quests = list(quests)
+
+    async def fetch(self) -> List[Quest]:
+        return list(self.quests)
+
+
+class FirestoreQuestSource(QuestSource):
+    """Reads the ``quests`` collection written by seed_firestore.py.
+
+    Honours FIRESTORE_EMULATOR_HOST, so it can run against the local emulator.
+    """
+
+    def __init__(self, collection: str = "quests", client=None):
+        self.client = client
+        self.collection = collection
+
+    async def fetch(self) -> List[Quest]:
+        if self.client is None:
+            # Imported on first refresh, off the startup path.
+            from google.cloud import firestore
+            self.client = firestore.AsyncClient()
+        query = self.client.collection(self.collection).select(["text"])
+        return [Quest(id=doc.id, text=doc.get("text")) async for doc in query.stream()]
+
+
+class QuestCatalogueCache:
+    """In-memory catalogue snapshot kept fresh by a background task.
+
+    Requests always read ``current`` and never wait on the source: the last good snapshot keeps
+    being served while a refresh runs, and also when a refresh fails.
+    """
+
+    def __init__(self, source: QuestSource, initial: QuestCatalogue, refresh_interval: float):
+        self.source = source
+        self.current = initial
+        self.refresh_interval = refresh_interval
+        self.last_refresh_error: Optional[str] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self):
+        try:
+            quests = await self.source.fetch()
+            self.current = QuestCatalogue(quests)
+            self.last_refresh_error = None
+        except Exception as e:
+            self.last_refresh_error = str(e)
+            logger.warning("Error refreshing quest catalogue, keeping the previous snapshot: %s", e)
+
+    async def _refresh_forever(self):
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.refresh_interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_forever())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def create_quest_catalogue_cache() -> QuestCatalogueCache:
+    """Starts from the bundled quests.txt and refreshes from QUEST_SOURCE (``file`` or ``firestore``)."""
+    bundled = load_quests()
+    backend = os.getenv("QUEST_SOURCE", "file")
+    if backend == "file":
+        source = InMemoryQuestSource(bundled)
+    elif backend == "firestore":
+        source = FirestoreQuestSource(os.getenv("QUEST_COLLECTION", "quests"))
+    else:
+        raise ValueError(f"Unknown QUEST_SOURCE: {backend}")
+    return QuestCatalogueCache(
+        source,
+        initial=QuestCatalogue(bundled),
+        refresh_interval=float(os.getenv("QUEST_REFRESH_SECONDS", "300")),
+    )
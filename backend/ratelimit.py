@@ -0,0 +1,139 @@
+import logging
+import math
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limit exceeded, retry after {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class TokenBucketStore(ABC):
+    """Atomically takes ``cost`` tokens from every bucket in ``keys``, or from none of them.
+
+    Returns ``(allowed, retry_after_seconds)``.
+    """
+
+    @abstractmethod
+    async def take(self, keys: List[str], capacity: float, refill_per_second: float, cost: float) -> Tuple[bool, float]:
+        ...
+
+
+class MemoryTokenBucketStore(TokenBucketStore):
+    """Per-process buckets. Limits are per worker; use RedisTokenBucketStore to share them."""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def take(self, keys, capacity, refill_per_second, cost):
+        now = time.monotonic()
+        levels = []
+        wait = 0.0
+        for key in keys:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * refill_per_second)
+            levels.append(tokens)
+            if tokens < cost:
+                wait = max(wait, (cost - tokens) / refill_per_second)
+        if wait > 0:
+            return False, wait
+
+        for key, tokens in zip(keys, levels):
+            self._buckets[key] = [tokens - cost, now]
+            self._buckets.move_to_end(key)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return True, 0.0
+
+
+# Same algorithm as MemoryTokenBucketStore, run atomically inside Redis using the server clock.
+_TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local levels = {}
+local wait = 0
+for i, key in ipairs(KEYS) do
+  local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+  local tokens = tonumber(bucket[1]) or capacity
+  local updated = tonumber(bucket[2]) or now
+  tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+  levels[i] = tokens
+  if tokens < cost then
+    wait = math.max(wait, (cost - tokens) / rate)
+  end
+end
+if wait > 0 then
+  return {0, tostring(wait)}
+end
+local ttl = math.ceil(capacity / rate) + 1
+for i, key in ipairs(KEYS) do
+  redis.call('HSET', key, 'tokens', tostring(levels[i] - cost), 'ts', tostring(now))
+  redis.call('EXPIRE', key, ttl)
+end
+return {1, '0'}
+"""
+
+
+class RedisTokenBucketStore(TokenBucketStore):
+    """Buckets shared by every worker and instance, kept in any Redis-protocol server."""
+
+    def __init__(self, url: str, timeout: float = 0.05):
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._script = self.client.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, keys, capacity, refill_per_second, cost):
+        allowed, wait = await self._script(keys=keys, args=[capacity, refill_per_second, cost])
+        return bool(int(allowed)), float(wait)
+
+
+class RateLimiter:
+    """Token-bucket limiter: bursts up to ``capacity`` and refills at ``refill_per_second``.
+
+    If the store is unreachable the request is allowed (fail open) and ``store_errors`` counts it.
+    """
+
+    def __init__(self, name: str, store: TokenBucketStore, capacity: float, refill_per_second: float):
+        self.name = name
+        self.store = store
+        self.capacity = capacity
+        self.refill_per_second = refill_per_second
+        self.rejections = 0
+        self.store_errors = 0
+
+    async def hit(self, keys: List[str], cost: float = 1):
+        bucket_keys = [f"ratelimit:{self.name}:{key}" for key in keys]
+        try:
+            allowed, retry_after = await self.store.take(bucket_keys, self.capacity, self.refill_per_second, cost)
+        except Exception as e:
+            self.store_errors += 1
+            logger.warning("Rate limit store unavailable, allowing request: %s", e)
+            return
+        if not allowed:
+            self.rejections += 1
+            raise RateLimited(retry_after)
+
+
+def retry_after_header(retry_after: float) -> str:
+    return str(max(1, math.ceil(retry_after)))
+
+
+def create_token_bucket_store() -> TokenBucketStore:
+    backend = os.getenv("RATE_LIMIT_STORE", "memory")
+    if backend == "memory":
+        return MemoryTokenBucketStore()
+    if backend == "redis":
+        return RedisTokenBucketStore(os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0"))
+    raise ValueError(f"Unknown RATE_LIMIT_STORE: {backend}")
@@ -0,0 +1,94 @@
+import hashlib
+import os
+import random
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+_NON_WORD = re.compile(r"[\W_]+", re.UNICODE)
+
+
+def normalize_message(message: str) -> str:
+    return _NON_WORD.sub(" ", message.casefold()).strip()
+
+
+def prompt_fingerprint(*parts: str) -> str:
+    """Short hash of everything besides the message that shapes a reply (prompt, model name)."""
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+class _Entry:
+    __slots__ = ("replies", "created")
+
+    def __init__(self, now: float):
+        self.replies: List[str] = []
+        self.created = now
+
+
+class ReplyCache:
+    """LRU + TTL cache of model replies for stateless openers ("hi", "can't sleep").
+
+    Each key collects up to ``variants_per_key`` distinct replies from real model calls before it
+    starts serving them, and then answers with a random variant so repeated openers don't all
+    get the same canned text.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, variants_per_key: int, max_history_turns: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.variants_per_key = variants_per_key
+        self.max_history_turns = max_history_turns
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def applies_to(self, history_length: int) -> bool:
+        return history_length <= self.max_history_turns
+
+    def key(self, message: str, fingerprint: str) -> Optional[str]:
+        normalized = normalize_message(message)
+        return f"{fingerprint}:{normalized}" if normalized else None
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._live_entry(key)
+        if entry is None or len(entry.replies) < self.variants_per_key:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return random.choice(entry.replies)
+
+    def add(self, key: str, reply: str):
+        entry = self._live_entry(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(time.monotonic())
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if reply and reply not in entry.replies and len(entry.replies) < self.variants_per_key:
+            entry.replies.append(reply)
+
+    def _live_entry(self, key: str) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() - entry.created > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        return entry
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+def create_reply_cache() -> Optional[ReplyCache]:
+    """Returns the reply cache if REPLY_CACHE_ENABLED is set, otherwise None."""
+    if os.getenv("REPLY_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    return ReplyCache(
+        max_entries=int(os.getenv("REPLY_CACHE_MAX_ENTRIES", "5000")),
+        ttl_seconds=float(os.getenv("REPLY_CACHE_TTL_SECONDS", "86400")),
+        variants_per_key=int(os.getenv("REPLY_CACHE_VARIANTS", "5")),
+        max_history_turns=int(os.getenv("REPLY_CACHE_MAX_HISTORY_TURNS", "0")),
+    )
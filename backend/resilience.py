@@ -0,0 +1,259 @@
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the upstream while the circuit breaker is open."""
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's upstream budget runs out."""
+
+
+class RetriesExhausted(Exception):
+    """Internal: a retryable error persisted; the last error is attached as ``__cause__``."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Transient upstream failures: overload, rate limiting, 5xx and timeouts."""
+    # Imported here so that importing this module stays cheap at startup.
+    from google.api_core import exceptions as google_exceptions
+
+    retryable = (
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.InternalServerError,
+        google_exceptions.TooManyRequests,
+        google_exceptions.DeadlineExceeded,
+        google_exceptions.GatewayTimeout,
+        asyncio.TimeoutError,
+        ConnectionError,
+    )
+    return isinstance(error, retryable)
+
+
+def is_refusal(error: BaseException) -> bool:
+    """The upstream answered but refused the request: a bad request or a blocked prompt."""
+    from google.api_core import exceptions as google_exceptions
+
+    if isinstance(error, google_exceptions.InvalidArgument):
+        return True
+    # Raised only by the Gemini SDK, which has been imported by then; importing it here would
+    # block the event loop for about a second on the first error.
+    generation_types = sys.modules.get("google.generativeai.types")
+    return generation_types is not None and isinstance(
+        error, (generation_types.BlockedPromptException, generation_types.StopCandidateException)
+    )
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and fails fast for ``reset_seconds``.
+
+    After that, one trial call is let through (half-open): success closes the circuit, failure
+    opens it again.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self._trial_in_flight = False
+        self.state = "closed"
+
+    def abandon(self):
+        """The call was cancelled before it produced an outcome."""
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self._trial_in_flight = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+                logger.warning("Upstream circuit breaker opened after %d consecutive failures.", self.consecutive_failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Recent successful call latencies, used to pick the hedging delay and by the router's
+    latency targets."""
+
+    def __init__(self, size: int = 200):
+        self._samples = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentile(self, fraction: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ResilientCaller:
+    """Runs upstream calls with a deadline, jittered retries, optional hedging and a circuit breaker.
+
+    ``make_call`` must start a fresh, independent call each time it is invoked, since retries and
+    hedges call it more than once (e.g. build a new chat session per attempt). A streaming call
+    returns at its first chunk, so its latency is tracked apart from that of complete replies.
+    """
+
+    def __init__(self, deadline_seconds: float, max_retries: int, backoff_base_seconds: float,
+                 backoff_max_seconds: float, breaker: CircuitBreaker, hedging: bool = False,
+                 hedge_min_samples: int = 20, hedge_percentile: float = 0.95):
+        self.deadline_seconds = deadline_seconds
+        self.max_retries = max_retries
+        self.backoff_base_seconds = backoff_base_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.breaker = breaker
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_percentile = hedge_percentile
+        # Complete replies, and time to the first chunk of streamed ones.
+        self.latency = LatencyTracker()
+        self.first_chunk_latency = LatencyTracker()
+        self.retries = 0
+        self.hedges = 0
+        self.deadline_exceeded = 0
+
+    async def call(self, make_call: Callable[[], Awaitable[T]], deadline: Optional[float] = None,
+                   stream: bool = False) -> T:
+        """``deadline`` (a ``time.monotonic()`` value) caps the call below ``deadline_seconds``,
+        e.g. the time a request has left after trying another backend. ``stream`` says that the
+        call returns a stream at its first chunk."""
+        if not self.breaker.allow():
+            raise CircuitOpen()
+
+        own_deadline = time.monotonic() + self.deadline_seconds
+        effective = own_deadline if deadline is None else min(deadline, own_deadline)
+        try:
+            latency = self.first_chunk_latency if stream else self.latency
+            result = await self._call_with_retries(make_call, effective, latency)
+        except DeadlineExceeded:
+            if effective < own_deadline:
+                # Ran out of the request's remaining time, not this upstream's full budget.
+                self.breaker.abandon()
+            else:
+                self.breaker.record_failure()
+            raise
+        except RetriesExhausted as e:
+            self.breaker.record_failure()
+            raise e.__cause__ or e
+        except Exception as e:
+            if is_refusal(e):
+                # A bad request or a blocked prompt: the upstream is up and answered.
+                self.breaker.record_success()
+            else:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.abandon()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _call_with_retries(self, make_call: Callable[[], Awaitable[T]], deadline: float,
+                                 latency: LatencyTracker) -> T:
+        budget = deadline - time.monotonic()
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            started = time.monotonic()
+            try:
+                if remaining <= 0:
+                    raise asyncio.TimeoutError()
+                result = await asyncio.wait_for(self._attempt(make_call, latency), timeout=remaining)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and time.monotonic() >= deadline:
+                    self.deadline_exceeded += 1
+                    raise DeadlineExceeded(f"Upstream call exceeded {budget:.1f}s")
+                if not is_retryable(e):
+                    raise
+                # Full jitter: spreads retries from many requests over the backoff window.
+                backoff = random.uniform(0, min(self.backoff_max_seconds, self.backoff_base_seconds * 2 ** attempt))
+                if attempt >= self.max_retries or time.monotonic() + backoff >= deadline:
+                    raise RetriesExhausted() from e
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(backoff)
+                continue
+
+            latency.record(time.monotonic() - started)
+            return result
+
+    def _hedge_delay(self, latency: LatencyTracker) -> Optional[float]:
+        if not self.hedging or len(latency) < self.hedge_min_samples:
+            return None
+        return latency.percentile(self.hedge_percentile)
+
+    async def _attempt(self, make_call: Callable[[], Awaitable[T]], latency: LatencyTracker) -> T:
+        hedge_delay = self._hedge_delay(latency)
+        if hedge_delay is None:
+            return await make_call()
+
+        # Hedged request: if the first call is slower than the recent p95, fire a duplicate
+        # and take whichever finishes first.
+        pending = {asyncio.ensure_future(make_call())}
+        try:
+            done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+            if not done:
+                self.hedges += 1
+                pending.add(asyncio.ensure_future(make_call()))
+
+            error: Optional[BaseException] = None
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if not pending:
+                    raise error
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+def create_resilient_caller() -> ResilientCaller:
+    return ResilientCaller(
+        deadline_seconds=float(os.getenv("UPSTREAM_DEADLINE_SECONDS", "20")),
+        max_retries=int(os.getenv("UPSTREAM_MAX_RETRIES", "2")),
+        backoff_base_seconds=float(os.getenv("UPSTREAM_BACKOFF_BASE_SECONDS", "0.2")),
+        backoff_max_seconds=float(os.getenv("UPSTREAM_BACKOFF_MAX_SECONDS", "2")),
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+            reset_seconds=float(os.getenv("BREAKER_RESET_SECONDS", "30")),
+        ),
+        hedging=os.getenv("UPSTREAM_HEDGING", "false").lower() in ("1", "true", "yes"),
+    )
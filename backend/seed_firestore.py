@@ -1,29 +1,30 @@
-import os
 from google.cloud import firestore
 
+from quests import load_quests
+
 # Ensure the script uses the correct project
 # In a real GCP environment, you might not need to set this explicitly
 # if the environment is already configured.
 # os.environ["GCLOUD_PROJECT"] = "your-gcp-project-id"
+# Set FIRESTORE_EMULATOR_HOST to seed the local emulator instead.
+
+# Firestore accepts at most 500 writes per batch.
+BATCH_SIZE = 500
 
-# Initialize Firestore DB Client
-db = firestore.Client()
 
-quests = [
-    "Take 5 deep, slow breaths.",
-    "Write down one thing you are grateful for today.",
-    "Step outside for 60 seconds of fresh air.",
-    "Listen to one full song without any other distractions.",
-    "Stretch your arms and back for 30 seconds.",
-    "Drink a full glass of water.",
-    "Tidy up one small area of your room.",
-    "Send a positive message to a friend.",
-    "Think of a happy memory for a moment.",
-    "Look out a window and notice 3 details you haven't before."
-]
+def seed_quests(db, quests, collection="quests"):
+    """Writes quests in batches under their content-derived ids, so re-running is idempotent."""
+    quests_collection = db.collection(collection)
+    for start in range(0, len(quests), BATCH_SIZE):
+        batch = db.batch()
+        for quest in quests[start:start + BATCH_SIZE]:
+            batch.set(quests_collection.document(quest.id), {"text": quest.text})
+        batch.commit()
 
-# Add each quest to the 'quests' collection
-for quest_text in quests:
-    db.collection('quests').add({'text': quest_text})
 
-print(f"Successfully seeded {len(quests)} quests to Firestore.")
+if __name__ == "__main__":
+    # Initialize Firestore DB Client
+    db = firestore.Client()
+    quests = load_quests()
+    seed_quests(db, quests)
+    print(f"Successfully seeded {len(quests)} quests to Firestore.")
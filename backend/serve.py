@@ -0,0 +1,75 @@
+"""Production entrypoint for the backend (used by the Dockerfile and `run.py --prod`).
+
+    python serve.py
+
+Runs uvicorn with one worker per available core (WEB_CONCURRENCY to override), uvloop and
+httptools when they are installed, tuned keep-alive and listen backlog, and a graceful
+shutdown: on SIGTERM the server stops accepting connections, gives in-flight requests
+(including streaming chats) up to GRACEFUL_SHUTDOWN_SECONDS to finish, then runs the app's
+lifespan shutdown, which flushes the conversation log and the log queue.
+"""
+import importlib.util
+import logging
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+logger = logging.getLogger("kelvin.serve")
+
+
+def available_cores() -> int:
+    # sched_getaffinity respects CPU pinning (e.g. taskset, some container runtimes).
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def main():
+    load_dotenv()
+    # The in-memory journal is empty after every restart, i.e. every deploy. Chat doesn't depend on
+    # the journal, so this is logged loudly rather than refusing to start.
+    if os.getenv("JOURNAL_BACKEND", "memory") == "memory":
+        logger.error("JOURNAL_BACKEND is %s: journal entries will be lost on every restart and deploy. "
+                     "Use firestore, or sqlite on a persistent volume.",
+                     "memory" if os.getenv("JOURNAL_BACKEND") else "not set, so the in-memory journal is used")
+    workers = int(os.getenv("WEB_CONCURRENCY") or available_cores())
+    if workers > 1:
+        # Per-process state is not shared between workers. In-memory sessions are the costliest:
+        # a turn reaching a worker without its session gets a 404 and re-uploads the transcript.
+        for name, default, shared in (
+            ("SESSION_BACKEND", "memory", "redis"),
+            ("RATE_LIMIT_STORE", "memory", "redis"),
+            ("JOURNAL_BACKEND", "memory", "sqlite or firestore"),
+        ):
+            if os.getenv(name, default) == "memory":
+                logger.warning("%s=memory is per worker with %d workers; use %s to share it.", name, workers, shared)
+        logger.warning("Idempotency keys and history summaries are per worker with %d workers; "
+                       "duplicates and retries reaching another worker make a new model call.", workers)
+
+    uvicorn.run(
+        "main:app",
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8080")),
+        workers=workers,
+        loop="uvloop" if installed("uvloop") else "asyncio",
+        http="httptools" if installed("httptools") else "h11",
+        # Longer than typical load balancer idle timeouts (60s), so the proxy closes idle
+        # connections first and never reuses one we've just closed.
+        timeout_keep_alive=int(os.getenv("KEEP_ALIVE_SECONDS", "75")),
+        backlog=int(os.getenv("LISTEN_BACKLOG", "2048")),
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_SHUTDOWN_SECONDS", "25")),
+        # Request counts and latency are on /metrics; uvicorn's access log writes a plain-text line
+        # per request outside the JSON log queue, so it is off unless ACCESS_LOG is set.
+        access_log=os.getenv("ACCESS_LOG", "false").lower() in ("1", "true", "yes"),
+        proxy_headers=True,
+        forwarded_allow_ips=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1"),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+class SessionStore(ABC):
+    """Server-side conversation history, keyed by an opaque session id.
+
+    History turns use the same shape Gemini expects: ``{"role": ..., "parts": [...]}``.
+    Methods are async so networked backends (Redis, Firestore) can implement the same interface.
+    """
+
+    @abstractmethod
+    async def create(self, history: Optional[List[Dict]] = None) -> str:
+        ...
+
+    @abstractmethod
+    async def get_history(self, session_id: str) -> Optional[List[Dict]]:
+        """Returns the session's history, or None if the session is unknown or expired."""
+
+    @abstractmethod
+    async def append(self, session_id: str, turns: List[Dict]) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        ...
+
+
+class _Session:
+    __slots__ = ("history", "size", "last_access")
+
+    def __init__(self, history: List[Dict], now: float):
+        self.history = history
+        self.size = sum(_turn_size(turn) for turn in history)
+        self.last_access = now
+
+
+def _turn_size(turn: Dict) -> int:
+    # Approximate bytes held by one turn; good enough to enforce a memory cap.
+    return 64 + len(turn["role"]) + sum(len(part) for part in turn["parts"])
+
+
+class InMemorySessionStore(SessionStore):
+    """Per-process session store with LRU eviction, an idle TTL and a total memory cap."""
+
+    def __init__(self, max_sessions: int, ttl_seconds: float, max_bytes: int):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        # Ordered from least to most recently used.
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    async def create(self, history: Optional[List[Dict]] = None) -> str:
+        now = time.monotonic()
+        session_id = uuid.uuid4().hex
+        session = _Session(list(history or []), now)
+        self._sessions[session_id] = session
+        self.total_bytes += session.size
+        self._evict(now)
+        return session_id
+
+    async def get_history(self, session_id: str) -> Optional[List[Dict]]:
+        session = self._touch(session_id)
+        return list(session.history) if session else None
+
+    async def append(self, session_id: str, turns: List[Dict]) -> None:
+        session = self._touch(session_id)
+        if session is None:
+            return
+        added = sum(_turn_size(turn) for turn in turns)
+        session.history.extend(turns)
+        session.size += added
+        self.total_bytes += added
+        self._evict(session.last_access)
+
+    async def delete(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id, None)
+        if session:
+            self.total_bytes -= session.size
+
+    def _touch(self, session_id: str) -> Optional[_Session]:
+        now = time.monotonic()
+        self._evict(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict(self, now: float) -> None:
+        # Least recently used sessions sit at the front, so expired ones are always found there first.
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            expired = now - session.last_access > self.ttl_seconds
+            over_capacity = len(self._sessions) > self.max_sessions or self.total_bytes > self.max_bytes
+            if not (expired or over_capacity):
+                break
+            del self._sessions[session_id]
+            self.total_bytes -= session.size
+
+
+class RedisSessionStore(SessionStore):
+    """Sessions shared by every worker and instance, kept in any Redis-protocol server.
+
+    Each session is a list holding a marker (so an empty session still exists) followed by its
+    turns as JSON. Every access pushes the expiry back to ``ttl_seconds``, an idle TTL as in the
+    in-memory store; the server's maxmemory policy bounds the total size.
+    """
+
+    _MARKER = b"session"
+
+    def __init__(self, url: str, ttl_seconds: float, timeout: float = 1.0):
+        import redis.asyncio as redis
+
+        self.ttl_seconds = int(ttl_seconds)
+        self.client = redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    async def create(self, history: Optional[List[Dict]] = None) -> str:
+        session_id = uuid.uuid4().hex
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, self._MARKER, *(json.dumps(turn) for turn in history or []))
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+        return session_id
+
+    async def get_history(self, session_id: str) -> Optional[List[Dict]]:
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.lrange(key, 1, -1)
+            pipe.expire(key, self.ttl_seconds)
+            turns, exists = await pipe.execute()
+        return [json.loads(turn) for turn in turns] if exists else None
+
+    async def append(self, session_id: str, turns: List[Dict]) -> None:
+        key = self._key(session_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            # RPUSHX leaves an expired or deleted session deleted.
+            pipe.rpushx(key, *(json.dumps(turn) for turn in turns))
+            pipe.expire(key, self.ttl_seconds)
+            await pipe.execute()
+
+    async def delete(self, session_id: str) -> None:
+        await self.client.delete(self._key(session_id))
+
+
+def create_session_store() -> SessionStore:
+    backend = os.getenv("SESSION_BACKEND", "memory")
+    ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", "3600"))
+    if backend == "memory":
+        return InMemorySessionStore(
+            max_sessions=int(os.getenv("SESSION_MAX_COUNT", "10000")),
+            ttl_seconds=ttl_seconds,
+            max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))),
+        )
+    if backend == "redis":
+        return RedisSessionStore(os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/0"), ttl_seconds)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend}")
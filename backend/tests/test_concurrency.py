@@ -0,0 +1,113 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from concurrency import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, UpstreamBusy, UpstreamLimiter  # noqa: E402
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiters_are_admitted_by_priority_then_in_order():
+    async def scenario():
+        limiter = UpstreamLimiter(max_concurrent=1, max_waiting=10)
+        admitted = []
+        release = asyncio.Event()
+
+        async def request(name, priority):
+            async with limiter.slot(priority):
+                admitted.append(name)
+                await release.wait()
+
+        holder = asyncio.create_task(request("holder", PRIORITY_INTERACTIVE))
+        await settle()
+        waiters = [asyncio.create_task(request(name, priority)) for name, priority in (
+            ("summary", PRIORITY_BACKGROUND), ("chat-1", PRIORITY_INTERACTIVE), ("chat-2", PRIORITY_INTERACTIVE),
+        )]
+        await settle()
+        assert limiter.waiting_by_priority() == {PRIORITY_INTERACTIVE: 2, PRIORITY_BACKGROUND: 1}
+        release.set()
+        await asyncio.gather(holder, *waiters)
+        assert admitted == ["holder", "chat-1", "chat-2", "summary"]
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_too_long_is_a_timeout():
+    async def scenario():
+        limiter = UpstreamLimiter(max_concurrent=1, max_waiting=10, max_wait_seconds=0.05)
+        async with limiter.slot():
+            with pytest.raises(UpstreamBusy) as busy:
+                async with limiter.slot():
+                    pass
+        assert busy.value.reason == "timeout"
+        assert limiter.rejected["timeout"] == 1
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_full_queue_sheds_background_work_before_chat_turns():
+    async def scenario():
+        limiter = UpstreamLimiter(max_concurrent=1, max_waiting=2)
+        release = asyncio.Event()
+
+        async def request(priority):
+            async with limiter.slot(priority):
+                await release.wait()
+
+        holder = asyncio.create_task(request(PRIORITY_INTERACTIVE))
+        await settle()
+        summaries = [asyncio.create_task(request(PRIORITY_BACKGROUND)) for _ in range(2)]
+        await settle()
+        chat = asyncio.create_task(request(PRIORITY_INTERACTIVE))
+        await settle()
+        # The newest summary gave up its place; the chat turn is queued.
+        assert summaries[1].done() and isinstance(summaries[1].exception(), UpstreamBusy)
+        assert limiter.waiting_by_priority() == {PRIORITY_INTERACTIVE: 1, PRIORITY_BACKGROUND: 1}
+
+        # With only chat turns ahead, a summary is shed itself.
+        with pytest.raises(UpstreamBusy):
+            async with limiter.slot(PRIORITY_BACKGROUND):
+                pass
+        release.set()
+        await asyncio.gather(holder, summaries[0], chat)
+        assert limiter.rejected["queue_full"] == 2
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_waiter_passes_on_a_slot_handed_to_it():
+    async def scenario():
+        limiter = UpstreamLimiter(max_concurrent=1, max_waiting=10)
+        admitted = []
+        release = asyncio.Event()
+
+        async def request(name):
+            async with limiter.slot():
+                admitted.append(name)
+                await release.wait()
+
+        holder = asyncio.create_task(request("holder"))
+        await settle()
+        cancelled = asyncio.create_task(request("cancelled"))
+        queued = asyncio.create_task(request("queued"))
+        await settle()
+        # The holder releases, handing its slot to the first waiter, which is cancelled before
+        # it gets to run.
+        release.set()
+        await holder
+        cancelled.cancel()
+        await asyncio.gather(cancelled, queued, return_exceptions=True)
+        assert admitted == ["holder", "queued"]
+        assert limiter.in_flight == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,54 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from crisis import create_crisis_detector  # noqa: E402
+
+# The check /api/chat used before the phrase list: a plain substring search.
+LEGACY_KEYWORDS = ["kill myself", "want to die", "self harm"]
+# Matches of the substring check that were false positives, and are deliberately dropped.
+LEGACY_FALSE_POSITIVES = {"i want to diet before summer"}
+
+MESSAGES = [
+    "I want to kill myself",
+    "i want to die",
+    "I really want to die tonight.",
+    "I've been self harming again",
+    "i self harmed yesterday",
+    "thinking about self harm",
+    "I might do myself harm",
+    "iwant to die",
+    "ikill myself every time i check the news",
+    "i want to diet before summer",
+    "I SELF HARM when it gets bad",
+    "skill myself up",
+    "self harmless prank",
+    "I'm fine, just tired",
+    "I want to dine out tonight",
+    "my friend said she wants to kill herself",
+]
+
+detector = create_crisis_detector()
+
+
+def legacy_is_crisis(message: str) -> bool:
+    return any(keyword in message.lower() for keyword in LEGACY_KEYWORDS)
+
+
+def test_matches_everything_the_legacy_check_matched():
+    missed = [message for message in MESSAGES
+              if legacy_is_crisis(message) and message not in LEGACY_FALSE_POSITIVES and not detector.matches(message)]
+    assert missed == []
+
+
+def test_matches_inflections_and_obfuscation():
+    for message in ["I've been self harming again", "i self harmed yesterday", "k1ll mys3lf", "SELF-HARM", "quiero morirme",
+                    "so many suicides this year", "selfharming", "I wanna die"]:
+        assert detector.matches(message), message
+
+
+def test_ignores_unrelated_messages():
+    for message in ["I'm fine, just tired", "I want to dine out tonight", "i want to diet before summer",
+                    "I ran 10 kms this morning", "kmsomething", "I wanna diet", "selfharmony"]:
+        assert not detector.matches(message), message
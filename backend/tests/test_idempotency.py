@@ -0,0 +1,135 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from idempotency import Abandoned, IdempotencyMismatch, IdempotencyStore  # noqa: E402
+
+
+def test_concurrent_duplicates_share_one_call():
+    async def scenario():
+        store = IdempotencyStore()
+        calls = []
+        release = asyncio.Event()
+
+        async def compute():
+            calls.append(1)
+            await release.wait()
+            return "reply"
+
+        requests = [asyncio.create_task(store.run("key", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        assert await asyncio.gather(*requests) == ["reply"] * 3
+        assert len(calls) == 1
+        assert store.joined == 2
+
+        # A later retry is answered from the remembered result.
+        assert await store.run("key", compute) == "reply"
+        assert len(calls) == 1 and store.replayed == 1
+
+    asyncio.run(scenario())
+
+
+def test_failures_are_shared_but_not_remembered():
+    async def scenario():
+        store = IdempotencyStore()
+        release = asyncio.Event()
+
+        async def fail():
+            await release.wait()
+            raise RuntimeError("upstream down")
+
+        requests = [asyncio.create_task(store.run("key", fail)) for _ in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*requests, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+
+        async def succeed():
+            return "reply"
+
+        assert await store.run("key", succeed) == "reply"
+
+    asyncio.run(scenario())
+
+
+def test_a_waiter_takes_over_from_an_abandoned_owner():
+    async def scenario():
+        store = IdempotencyStore()
+        assert await store.join("key") == (False, None)
+
+        waiter = asyncio.create_task(store.join("key"))
+        await asyncio.sleep(0)
+        store.fail("key", Abandoned())
+        # The waiter now owns the key instead of getting the owner's error.
+        assert await waiter == (False, None)
+        store.finish("key", "reply")
+        assert await store.join("key") == (True, "reply")
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_owner_lets_a_waiter_take_over():
+    async def scenario():
+        store = IdempotencyStore()
+        started = asyncio.Event()
+        computing = []
+
+        async def hang():
+            computing.append(asyncio.current_task())
+            started.set()
+            await asyncio.sleep(10)
+
+        async def succeed():
+            return "reply"
+
+        owner = asyncio.create_task(store.run("key", hang))
+        await started.wait()
+        waiter = asyncio.create_task(store.run("key", succeed))
+        await asyncio.sleep(0)
+        # Cancelling the shared computation abandons the key.
+        computing[0].cancel()
+        assert await waiter == "reply"
+        with pytest.raises(asyncio.CancelledError):
+            await owner
+
+    asyncio.run(scenario())
+
+
+def test_reusing_a_key_for_other_content_is_rejected():
+    async def scenario():
+        store = IdempotencyStore()
+
+        async def compute():
+            return "reply"
+
+        assert await store.run("key", compute, fingerprint="hi") == "reply"
+        with pytest.raises(IdempotencyMismatch):
+            await store.run("key", compute, fingerprint="something else")
+        assert await store.run("key", compute, fingerprint="hi") == "reply"
+
+        assert await store.join("pending", "a") == (False, None)
+        with pytest.raises(IdempotencyMismatch):
+            await store.join("pending", "b")
+
+    asyncio.run(scenario())
+
+
+def test_results_expire_and_are_evicted():
+    async def scenario():
+        store = IdempotencyStore(max_entries=2, ttl_seconds=0)
+
+        async def compute():
+            return "reply"
+
+        for key in ("a", "b", "c"):
+            await store.run(key, compute)
+        assert len(store) == 2
+        await asyncio.sleep(0.01)
+        assert await store.join("c") == (False, None)
+
+    asyncio.run(scenario())
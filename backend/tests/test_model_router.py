@@ -0,0 +1,116 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+
+from model_client import ModelClient  # noqa: E402
+from model_router import ModelBackend, ModelRouter, ModelSpec  # noqa: E402
+from resilience import CircuitBreaker, DeadlineExceeded, ResilientCaller  # noqa: E402
+
+
+def backend(name: str, cost: float = 0.0, deadline_seconds: float = 5) -> ModelBackend:
+    client = ModelClient(lambda: name)
+    client.model = name
+    caller = ResilientCaller(deadline_seconds=deadline_seconds, max_retries=0, backoff_base_seconds=0,
+                             backoff_max_seconds=0, breaker=CircuitBreaker(failure_threshold=5, reset_seconds=30))
+    return ModelBackend(ModelSpec(name=name, cost_per_1k_tokens=cost), client, caller)
+
+
+def fake_upstream(behaviour):
+    """make_call for the router: ``behaviour[model]`` is a reply, an exception or a delay."""
+    calls = []
+
+    def make_call(model):
+        async def call():
+            calls.append(model)
+            outcome = behaviour[model]
+            if isinstance(outcome, BaseException):
+                raise outcome
+            if isinstance(outcome, float):
+                await asyncio.sleep(outcome)
+            return f"reply from {model}"
+        return call
+
+    return make_call, calls
+
+
+def test_long_conversations_follow_registry_order_and_fall_back():
+    router = ModelRouter([backend("primary", cost=2), backend("secondary", cost=1), backend("tertiary")])
+    make_call, calls = fake_upstream({
+        "primary": google_exceptions.ServiceUnavailable("down"),
+        "secondary": google_exceptions.ServiceUnavailable("down"),
+        "tertiary": "ok",
+    })
+
+    assert asyncio.run(router.call(10_000, make_call)) == "reply from tertiary"
+    assert calls == ["primary", "secondary", "tertiary"]
+    assert router.fallbacks == 2
+    assert [b.failures for b in router.backends] == [1, 1, 0]
+
+
+def test_easy_turns_go_to_the_cheapest_backend():
+    router = ModelRouter([backend("primary", cost=2), backend("cheap", cost=0.5)], easy_turn_tokens=500)
+    make_call, calls = fake_upstream({"primary": "ok", "cheap": "ok"})
+
+    assert asyncio.run(router.call(100, make_call)) == "reply from cheap"
+    assert calls == ["cheap"]
+
+
+def test_refusals_are_raised_without_falling_back():
+    router = ModelRouter([backend("primary"), backend("secondary")])
+    make_call, calls = fake_upstream({"primary": google_exceptions.InvalidArgument("bad"), "secondary": "ok"})
+
+    with pytest.raises(google_exceptions.InvalidArgument):
+        asyncio.run(router.call(10_000, make_call))
+    assert calls == ["primary"]
+    assert router.primary.caller.breaker.consecutive_failures == 0
+
+
+def test_fallbacks_share_one_deadline():
+    # Each backend alone would allow 5s; the request as a whole only has 0.3s.
+    router = ModelRouter([backend("primary"), backend("secondary"), backend("tertiary")])
+    make_call, calls = fake_upstream({"primary": 1.0, "secondary": 1.0, "tertiary": 1.0})
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(router.call(10_000, make_call, deadline=time.monotonic() + 0.3))
+    assert time.monotonic() - started < 0.6
+    assert calls == ["primary"]
+    # Running out of the request's time isn't held against the backend's breaker.
+    assert router.primary.caller.breaker.consecutive_failures == 0
+
+
+def test_a_fallback_gets_only_the_time_left():
+    router = ModelRouter([backend("primary"), backend("secondary")])
+    make_call, calls = fake_upstream({"primary": google_exceptions.ServiceUnavailable("down"), "secondary": 0.5})
+
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(router.call(10_000, make_call, deadline=time.monotonic() + 0.2))
+    assert calls == ["primary", "secondary"]
+
+
+def test_a_stalled_stream_is_cut_off_at_the_deadline():
+    router = ModelRouter([backend("primary")])
+
+    async def stalled_stream():
+        yield "first chunk"
+        await asyncio.sleep(10)
+        yield "never sent"
+
+    async def read(deadline):
+        chunks = []
+        async for chunk in router.stream(router.primary, stalled_stream(), deadline):
+            chunks.append(chunk)
+        return chunks
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(read(time.monotonic() + 0.2))
+    assert time.monotonic() - started < 0.6
+    assert router.primary.caller.breaker.consecutive_failures == 1
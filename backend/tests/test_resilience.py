@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from google.api_core import exceptions as google_exceptions  # noqa: E402
+
+import resilience  # noqa: E402
+from resilience import CircuitBreaker, CircuitOpen, DeadlineExceeded, ResilientCaller  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def caller(breaker: CircuitBreaker = None, **kwargs) -> ResilientCaller:
+    options = dict(deadline_seconds=5, max_retries=2, backoff_base_seconds=0, backoff_max_seconds=0,
+                   breaker=breaker or CircuitBreaker(failure_threshold=3, reset_seconds=30))
+    options.update(kwargs)
+    return ResilientCaller(**options)
+
+
+def failing(error: BaseException):
+    async def call():
+        raise error
+    return call
+
+
+async def succeed():
+    return "ok"
+
+
+def test_breaker_opens_half_opens_and_closes(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=30)
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one trial call at a time.
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_trial_reopens_the_breaker(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    breaker.record_failure()
+
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.times_opened == 2
+    assert not breaker.allow()
+
+
+def test_open_breaker_fails_fast():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=30)
+    resilient = caller(breaker, max_retries=0)
+
+    with pytest.raises(google_exceptions.ServiceUnavailable):
+        asyncio.run(resilient.call(failing(google_exceptions.ServiceUnavailable("down"))))
+    with pytest.raises(CircuitOpen):
+        asyncio.run(resilient.call(succeed))
+
+
+def test_transient_errors_are_retried():
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise google_exceptions.ServiceUnavailable("busy")
+        return "ok"
+
+    resilient = caller()
+    assert asyncio.run(resilient.call(flaky)) == "ok"
+    assert resilient.retries == 2
+    assert resilient.breaker.consecutive_failures == 0
+
+
+def test_only_refusals_count_as_breaker_successes():
+    resilient = caller()
+    with pytest.raises(google_exceptions.InvalidArgument):
+        asyncio.run(resilient.call(failing(google_exceptions.InvalidArgument("bad request"))))
+    assert resilient.breaker.consecutive_failures == 0
+
+    for error in (google_exceptions.PermissionDenied("bad key"), ValueError("bug")):
+        with pytest.raises(type(error)):
+            asyncio.run(resilient.call(failing(error)))
+    assert resilient.breaker.consecutive_failures == 2
+
+
+def test_a_request_deadline_caps_the_call():
+    async def slow():
+        await asyncio.sleep(1)
+
+    resilient = caller()
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(resilient.call(slow, deadline=time.monotonic() + 0.1))
+    assert time.monotonic() - started < 0.5
+    # The request ran out of time, not the upstream.
+    assert resilient.breaker.consecutive_failures == 0
+    assert resilient.breaker.allow()
+
+
+def test_streamed_and_complete_latencies_are_tracked_apart():
+    resilient = caller()
+    asyncio.run(resilient.call(succeed))
+    asyncio.run(resilient.call(succeed, stream=True))
+    asyncio.run(resilient.call(succeed, stream=True))
+    assert len(resilient.latency) == 1
+    assert len(resilient.first_chunk_latency) == 2
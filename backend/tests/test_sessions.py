@@ -0,0 +1,47 @@
+import asyncio
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sessions import RedisSessionStore  # noqa: E402
+
+fakeredis = pytest.importorskip("fakeredis")
+
+TURNS = [{"role": "user", "parts": ["hi"]}, {"role": "model", "parts": ["Hello! How are you feeling today?"]}]
+
+
+def redis_store() -> RedisSessionStore:
+    store = RedisSessionStore("redis://localhost:6379/0", ttl_seconds=60)
+    store.client = fakeredis.FakeAsyncRedis()
+    return store
+
+
+def test_redis_sessions_round_trip():
+    async def scenario():
+        store = redis_store()
+        empty = await store.create()
+        seeded = await store.create(TURNS[:1])
+        assert await store.get_history(empty) == []
+        assert await store.get_history(seeded) == TURNS[:1]
+
+        await store.append(empty, TURNS)
+        assert await store.get_history(empty) == TURNS
+        assert await store.client.ttl(store._key(empty)) == 60
+
+        await store.delete(empty)
+        assert await store.get_history(empty) is None
+
+    asyncio.run(scenario())
+
+
+def test_appending_to_an_unknown_session_does_not_create_it():
+    async def scenario():
+        store = redis_store()
+        await store.append("unknown", TURNS)
+        assert await store.get_history("unknown") is None
+        assert not await store.client.exists(store._key("unknown"))
+
+    asyncio.run(scenario())
@@ -0,0 +1,234 @@
+import logging
+import zlib
+from typing import Callable, Optional, Sequence
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the standard library
+    orjson = None
+    import json
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - responses are gzip-only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+def dumps(data) -> str:
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, separators=(",", ":"))
+
+
+class FastJSONRequest(Request):
+    """Parses JSON bodies with orjson, which is several times faster than ``json`` on large
+    chat transcripts. Its decode error subclasses ``json.JSONDecodeError``, so FastAPI still
+    answers malformed bodies with 422."""
+
+    async def json(self):
+        if not hasattr(self, "_json"):
+            body = await self.body()
+            self._json = orjson.loads(body) if orjson is not None else json.loads(body)
+        return self._json
+
+
+class FastJSONRoute(APIRoute):
+    """Route class that hands endpoints (and FastAPI's body parsing) a ``FastJSONRequest``.
+
+    Responses need no equivalent: endpoints with a response model are already serialised
+    straight to bytes by Pydantic.
+    """
+
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def fast_json_handler(request: Request):
+            return await handler(FastJSONRequest(request.scope, request.receive))
+
+        return fast_json_handler
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Picks ``br`` or ``gzip`` from an Accept-Encoding header, or None."""
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, params = item.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+            self._zlib = None
+        else:
+            self._brotli = None
+            self._zlib = zlib.compressobj(gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._brotli.process(data) if self._brotli else self._zlib.compress(data)
+
+    def finish(self) -> bytes:
+        return self._brotli.finish() if self._brotli else self._zlib.flush()
+
+
+def decompress_body(body: bytes, max_bytes: int) -> bytes:
+    """Inflates a gzip or deflate request body, raising ValueError past ``max_bytes``."""
+    # 32 + MAX_WBITS accepts both the gzip and the zlib ("deflate") container.
+    decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+    data = decompressor.decompress(body, max_bytes + 1)
+    if len(data) > max_bytes or decompressor.unconsumed_tail:
+        raise ValueError("too large")
+    if not decompressor.eof:
+        raise zlib.error("truncated body")
+    return data
+
+
+class CompressionMiddleware:
+    """ASGI middleware for compressed request and response bodies.
+
+    Requests with ``Content-Encoding: gzip`` or ``deflate`` (what the browser's
+    CompressionStream produces) are inflated before routing, up to ``max_request_bytes``
+    after decompression; anything else is rejected with 415. Responses are compressed with
+    brotli (when installed) or gzip, as the client's Accept-Encoding allows, once they reach
+    ``minimum_size`` bytes. Server-sent events are never compressed: the compressor would hold
+    back chunks the client is waiting for.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, max_request_bytes: int = 5 * 1024 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 4,
+                 excluded_media_types: Sequence[str] = ("text/event-stream",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_request_bytes = max_request_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.excluded_media_types = tuple(excluded_media_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            inflated = await self._inflate_request(scope, receive, send, content_encoding)
+            if inflated is None:
+                return
+            scope, receive = inflated
+
+        encoding = negotiate_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, self._compressing_send(send, encoding))
+
+    async def _inflate_request(self, scope, receive, send, content_encoding: str):
+        if content_encoding not in ("gzip", "deflate"):
+            await JSONResponse({"detail": f"Unsupported Content-Encoding: {content_encoding}."}, status_code=415)(scope, receive, send)
+            return None
+
+        body = bytearray()
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            body += message.get("body", b"")
+            if len(body) > self.max_request_bytes:
+                await JSONResponse({"detail": "Request body too large."}, status_code=413)(scope, receive, send)
+                return None
+            if not message.get("more_body", False):
+                break
+        try:
+            data = decompress_body(bytes(body), self.max_request_bytes)
+        except ValueError:
+            await JSONResponse({"detail": "Request body too large."}, status_code=413)(scope, receive, send)
+            return None
+        except zlib.error as e:
+            logger.info("Rejected a malformed %s request body: %s", content_encoding, e)
+            await JSONResponse({"detail": "Malformed compressed request body."}, status_code=400)(scope, receive, send)
+            return None
+
+        raw_headers = [(name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")]
+        raw_headers.append((b"content-length", str(len(data)).encode("latin-1")))
+        delivered = False
+
+        async def receive_inflated():
+            nonlocal delivered
+            if not delivered:
+                delivered = True
+                return {"type": "http.request", "body": data, "more_body": False}
+            # Later calls wait for the disconnect, as with an uncompressed body.
+            return await receive()
+
+        return {**scope, "headers": raw_headers}, receive_inflated
+
+    def _compressing_send(self, send, encoding: str):
+        start = None
+        compressor: Optional[_Compressor] = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, compressor, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message.get("headers", []))
+                media_type = headers.get("content-type", "")
+                passthrough = "content-encoding" in headers or media_type.startswith(self.excluded_media_types)
+                if passthrough:
+                    await send(message)
+                else:
+                    # Held back until the first body chunk shows whether compression is worth it.
+                    start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                response_start, start = start, None
+                headers = MutableHeaders(scope=response_start)
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(response_start)
+                    await send(message)
+                    return
+                compressor = _Compressor(encoding, self.gzip_level, self.brotli_quality)
+                headers["Content-Encoding"] = encoding
+                if more_body:
+                    del headers["Content-Length"]
+                    await send(response_start)
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers["Content-Length"] = str(len(body))
+                    await send(response_start)
+                    await send({"type": "http.response.body", "body": body, "more_body": False})
+                    return
+            chunk = compressor.compress(body)
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        return send_compressed
@@ -17,16 +17,45 @@ const EmptyChatIllustration = () => (
     </div>
 );
 
+// Request bodies from this size up are gzip-compressed; smaller ones aren't worth the CPU.
+const COMPRESS_MIN_BYTES = 1024;
+
+// Encodes a JSON request body, gzip-compressing large ones (e.g. a long history seeding a new
+// session) where the browser supports CompressionStream. The backend inflates them.
+const jsonRequest = async (data: unknown): Promise<{ headers: Record<string, string>; body: BodyInit }> => {
+  const json = JSON.stringify(data);
+  if (json.length < COMPRESS_MIN_BYTES || typeof CompressionStream === 'undefined') {
+    return { headers: { 'Content-Type': 'application/json' }, body: json };
+  }
+  const compressed = new Blob([json]).stream().pipeThrough(new CompressionStream('gzip'));
+  return {
+    headers: { 'Content-Type': 'application/json', 'Content-Encoding': 'gzip' },
+    body: await new Response(compressed).blob(),
+  };
+};
+
 export default function ChatPage() {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
   const chatContainerRef = useRef<HTMLDivElement>(null);
+  const sessionIdRef = useRef<string | null>(null);
 
   useEffect(() => {
     chatContainerRef.current?.scrollTo({ top: chatContainerRef.current.scrollHeight, behavior: 'smooth' });
   }, [messages]);
 
+  // The server keeps the transcript for a session, so each turn only uploads the new message.
+  // If the session has expired, a new one is seeded with the history we already have locally.
+  const createSession = async (apiUrl: string | undefined, history: Message[]) => {
+    const { headers, body } = await jsonRequest({ chat_history: history.map(m => ({ role: m.role, parts: [m.text] })) });
+    const response = await fetch(`${apiUrl}/api/session`, { method: 'POST', headers, body });
+    if (!response.ok) throw new Error('Failed to start a chat session.');
+    const data = await response.json();
+    sessionIdRef.current = data.session_id;
+    return data.session_id as string;
+  };
+
   const handleSend = async () => {
     if (input.trim() === '' || isLoading) return;
 
@@ -38,16 +67,58 @@ export default function ChatPage() {
 
     try {
       const apiUrl = process.env.NEXT_PUBLIC_API_URL;
-      const response = await fetch(`${apiUrl}/api/chat`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ message: input, chat_history: messages.map(m => ({ role: m.role, parts: [m.text] })) }),
-      });
+      // One key per submitted message: if it is sent twice, the server makes one model call.
+      const idempotencyKey = crypto.randomUUID();
+      const sendMessage = async (sessionId: string) => {
+        const { headers, body } = await jsonRequest({ message: input, session_id: sessionId });
+        return fetch(`${apiUrl}/api/chat/stream`, {
+          method: 'POST',
+          headers: { ...headers, Accept: 'text/event-stream', 'Idempotency-Key': idempotencyKey },
+          body,
+        });
+      };
+
+      let response = await sendMessage(sessionIdRef.current ?? await createSession(apiUrl, messages));
+      if (response.status === 404) {
+        response = await sendMessage(await createSession(apiUrl, messages));
+      }
+
+      if (!response.ok || !response.body) throw new Error('Failed to get response from AI.');
+
+      // Read Server-Sent Events: `chunk` events carry partial text, `done` carries the full reply.
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let partial = '';
+      const showReply = (text: string) => setMessages([...newMessages, { role: 'model', text }]);
+
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const rawEvent = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+
+          let eventName = 'message';
+          let data = '';
+          for (const line of rawEvent.split('\n')) {
+            if (line.startsWith('event: ')) eventName = line.slice(7);
+            else if (line.startsWith('data: ')) data += line.slice(6);
+          }
+          if (!data) continue;
 
-      if (!response.ok) throw new Error('Failed to get response from AI.');
-      const data = await response.json();
-      const aiMessage: Message = { role: 'model', text: data.reply };
-      setMessages([...newMessages, aiMessage]);
+          const payload = JSON.parse(data);
+          if (eventName === 'chunk') {
+            partial += payload.text;
+            showReply(partial);
+          } else if (eventName === 'done') {
+            showReply(payload.reply);
+          }
+        }
+      }
 
     } catch (error) {
       console.error(error);
@@ -74,7 +145,7 @@ export default function ChatPage() {
               </div>
             ))
           )}
-          {isLoading && (
+          {isLoading && messages[messages.length - 1]?.role === 'user' && (
             <div className="flex items-end gap-2 justify-start">
                 <div className="p-3 rounded-2xl max-w-lg bg-dark-input rounded-bl-none">
                   <p className='animate-pulse'>● ● ●</p>
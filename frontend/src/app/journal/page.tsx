@@ -1,44 +1,148 @@
 'use client';
 
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useCallback } from 'react';
+
+type Mood = 'Happy' | 'Neutral' | 'Sad';
 
 interface JournalEntry {
-  date: string;
+  id: string;
   title: string;
-  mood: 'Happy' | 'Neutral' | 'Sad';
+  mood: Mood;
   text: string;
+  created_at: string;
+  // Absent until the server has stored the entry.
+  version?: number;
 }
 
+// Each entry is cached under its own localStorage key, so saving one entry doesn't re-serialise
+// the whole journal. Entries not yet uploaded are listed in PENDING_KEY; SYNC_VERSION_KEY is the
+// server change version we have merged up to, valid only for the server store SYNC_EPOCH_KEY.
+const ENTRY_PREFIX = 'journalEntry:';
+const PENDING_KEY = 'journalPending';
+const SYNC_VERSION_KEY = 'journalSyncVersion';
+const SYNC_EPOCH_KEY = 'journalSyncEpoch';
+const LEGACY_KEY = 'journalEntries';
+
+const getUserId = () => {
+  let userId = localStorage.getItem('kelvinUserId');
+  if (!userId) {
+    userId = crypto.randomUUID();
+    localStorage.setItem('kelvinUserId', userId);
+  }
+  return userId;
+};
+
+const cacheEntry = (entry: JournalEntry) => localStorage.setItem(ENTRY_PREFIX + entry.id, JSON.stringify(entry));
+
+const loadCachedEntries = (): JournalEntry[] => {
+  const entries: JournalEntry[] = [];
+  for (let i = 0; i < localStorage.length; i++) {
+    const key = localStorage.key(i);
+    if (key?.startsWith(ENTRY_PREFIX)) entries.push(JSON.parse(localStorage.getItem(key)!));
+  }
+  return entries;
+};
+
+const loadPending = (): string[] => JSON.parse(localStorage.getItem(PENDING_KEY) || '[]');
+const savePending = (ids: string[]) => localStorage.setItem(PENDING_KEY, JSON.stringify(ids));
+
+// Entries saved before sync existed were one array without ids; give them ids and queue them for upload.
+const migrateLegacyEntries = () => {
+  const saved = localStorage.getItem(LEGACY_KEY);
+  if (!saved) return;
+  const pending = loadPending();
+  for (const entry of JSON.parse(saved)) {
+    const migrated: JournalEntry = {
+      id: crypto.randomUUID(),
+      title: entry.title || 'No Title',
+      mood: entry.mood || 'Neutral',
+      text: entry.text || '',
+      created_at: entry.date,
+    };
+    cacheEntry(migrated);
+    pending.push(migrated.id);
+  }
+  savePending(pending);
+  localStorage.removeItem(LEGACY_KEY);
+};
+
+const newestFirst = (entries: JournalEntry[]) => [...entries].sort((a, b) => b.created_at.localeCompare(a.created_at));
+
 export default function JournalPage() {
   const [entries, setEntries] = useState<JournalEntry[]>([]);
   const [newTitle, setNewTitle] = useState('');
-  const [newMood, setNewMood] = useState<'Happy' | 'Neutral' | 'Sad'>('Neutral');
+  const [newMood, setNewMood] = useState<Mood>('Neutral');
   const [newEntry, setNewEntry] = useState('');
 
-  useEffect(() => {
-    const savedEntries = localStorage.getItem('journalEntries');
-    if (savedEntries) {
-      const parsedEntries = JSON.parse(savedEntries);
-      // Safely migrate old entries that might be missing fields
-      const migratedEntries = parsedEntries.map((entry: any) => ({
-        date: entry.date,
-        title: entry.title || 'No Title',
-        mood: entry.mood || 'Neutral',
-        text: entry.text || '',
-      }));
-      setEntries(migratedEntries);
+  // Uploads queued entries, then pulls only what changed on the server since the last sync.
+  const sync = useCallback(async () => {
+    const apiUrl = process.env.NEXT_PUBLIC_API_URL;
+    const headers = { 'Content-Type': 'application/json', 'X-User-Id': getUserId() };
+    const uploadPending = async () => {
+      // Re-read the queue each time: a save during the sync may have added to it.
+      for (let id = loadPending()[0]; id !== undefined; id = loadPending()[0]) {
+        const cached = localStorage.getItem(ENTRY_PREFIX + id);
+        if (cached) {
+          const response = await fetch(`${apiUrl}/api/journal/entries`, { method: 'POST', headers, body: cached });
+          if (response.ok) cacheEntry(await response.json());
+          // A rejected entry would block the queue forever; anything else is retried next sync.
+          else if (response.status !== 400 && response.status !== 422) throw new Error('Failed to upload a journal entry.');
+        }
+        savePending(loadPending().filter(pendingId => pendingId !== id));
+      }
+    };
+    try {
+      await uploadPending();
+
+      // A version is only meaningful for the store it came from; without a known epoch, start over.
+      let epoch = localStorage.getItem(SYNC_EPOCH_KEY);
+      let since = epoch ? Number(localStorage.getItem(SYNC_VERSION_KEY) || '0') : 0;
+      let storeReplaced = false;
+      let hasMore = true;
+      while (hasMore) {
+        const query = `since=${since}` + (epoch ? `&epoch=${encodeURIComponent(epoch)}` : '');
+        const response = await fetch(`${apiUrl}/api/journal/changes?${query}`, { headers });
+        if (!response.ok) throw new Error('Failed to fetch journal changes.');
+        const changes = await response.json();
+        // The server answered from 0 for a new epoch, so this page starts a full sync.
+        if (epoch && changes.epoch !== epoch) storeReplaced = true;
+        epoch = changes.epoch;
+        changes.entries.forEach(cacheEntry);
+        since = changes.version;
+        hasMore = changes.has_more;
+        localStorage.setItem(SYNC_EPOCH_KEY, changes.epoch);
+        localStorage.setItem(SYNC_VERSION_KEY, String(since));
+      }
+      if (storeReplaced) {
+        // The server's journal was reset; upload everything we have. Appends are idempotent per
+        // id, so entries the server still has are left unchanged.
+        const pending = new Set(loadPending());
+        savePending([...pending, ...loadCachedEntries().map(entry => entry.id).filter(id => !pending.has(id))]);
+        await uploadPending();
+      }
+      setEntries(newestFirst(loadCachedEntries()));
+    } catch (error) {
+      // Offline or the server is unavailable: the local copy stays usable and syncs next time.
+      console.error('Journal sync failed:', error);
     }
   }, []);
 
+  useEffect(() => {
+    migrateLegacyEntries();
+    setEntries(newestFirst(loadCachedEntries()));
+    sync();
+  }, [sync]);
+
   const handleSave = () => {
     if (newTitle.trim() === '' || newEntry.trim() === '') return;
-    const entry: JournalEntry = { date: new Date().toISOString(), title: newTitle, mood: newMood, text: newEntry };
-    const updatedEntries = [entry, ...entries];
-    setEntries(updatedEntries);
-    localStorage.setItem('journalEntries', JSON.stringify(updatedEntries));
+    const entry: JournalEntry = { id: crypto.randomUUID(), created_at: new Date().toISOString(), title: newTitle, mood: newMood, text: newEntry };
+    cacheEntry(entry);
+    savePending([...loadPending(), entry.id]);
+    setEntries([entry, ...entries]);
     setNewTitle('');
     setNewMood('Neutral');
     setNewEntry('');
+    sync();
   };
 
   const MoodDisplay = ({ mood }: { mood: string }) => {
@@ -65,7 +169,7 @@ export default function JournalPage() {
             <select 
               className="w-full bg-dark-input rounded-lg p-3 focus:outline-none focus:ring-2 focus:ring-brand-primary transition-all duration-300"
               value={newMood}
-              onChange={(e) => setNewMood(e.target.value as any)}
+              onChange={(e) => setNewMood(e.target.value as Mood)}
             >
               <option>Happy</option>
               <option>Neutral</option>
@@ -90,12 +194,12 @@ export default function JournalPage() {
       <div className="space-y-4">
         {entries.length > 0 ? (
           entries.map((entry) => (
-            <div key={entry.date} className="bg-dark-card p-4 rounded-2xl shadow-lg ring-1 ring-white/10">
+            <div key={entry.id} className="bg-dark-card p-4 rounded-2xl shadow-lg ring-1 ring-white/10">
               <h3 className="font-poppins text-xl font-bold mb-1 flex items-center">
                 <MoodDisplay mood={entry.mood} />
                 {entry.title}
               </h3>
-              <p className="text-xs text-gray-500 mb-2 ml-8">{new Date(entry.date).toLocaleString()}</p>
+              <p className="text-xs text-gray-500 mb-2 ml-8">{new Date(entry.created_at).toLocaleString()}</p>
               <p className="whitespace-pre-wrap text-gray-300 ml-8">{entry.text}</p>
             </div>
           ))
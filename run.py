@@ -1,4 +1,5 @@
 
+import argparse
 import subprocess
 import os
 import signal
@@ -31,9 +32,22 @@ def kill_proc_tree(pid, sig=signal.SIGTERM):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Run the Kelvin backend and frontend.")
+    parser.add_argument(
+        "--prod",
+        action="store_true",
+        help="Serve production builds: multi-worker backend (backend/serve.py) and `next start`, no reloader.",
+    )
+    args = parser.parse_args()
+
     # --- Commands to run ---
-    backend_command = "uvicorn main:app --reload"
-    frontend_command = "npm run dev"
+    if args.prod:
+        backend_command = "python serve.py"
+        frontend_command = "npm run build && npm run start"
+    else:
+        # The reloader watches files and runs a single worker; development only.
+        backend_command = "uvicorn main:app --reload"
+        frontend_command = "npm run dev"
 
     # --- Directories ---
     backend_dir = "backend"
@@ -41,10 +55,15 @@ def main():
 
     # --- Start Backend ---
     print("Starting backend...")
+    backend_env = dict(os.environ)
+    if args.prod:
+        # serve.py requires a journal backend; keep local production runs on a file.
+        backend_env.setdefault("JOURNAL_BACKEND", "sqlite")
     backend_process = subprocess.Popen(
         backend_command,
         shell=True,
         cwd=backend_dir,
+        env=backend_env,
         preexec_fn=os.setsid  # Create a new process group
     )
 
@@ -91,6 +110,7 @@ def main():
 
 
     # --- Wait for processes to terminate ---
+    # In --prod mode the backend drains in-flight requests first (GRACEFUL_SHUTDOWN_SECONDS).
     backend_process.wait()
     frontend_process.wait()
 